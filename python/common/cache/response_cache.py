@@ -0,0 +1,312 @@
+import asyncio
+import hashlib
+import json
+import random
+import sqlite3
+import threading
+import time
+import unicodedata
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import closing
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Optional, Tuple
+
+
+def cache_key(model_name: str, prompt: str, config: Any = None) -> str:
+    """
+    Cache key of a generation: (model name, compiled prompt, generation config).
+
+    The prompt is Unicode-normalized and stripped, so prompts that only differ
+    in surrounding whitespace share a response.
+    """
+    if config is not None and hasattr(config, "model_dump"):
+        config = config.model_dump(mode="json", exclude_none=True)
+    payload = {
+        "model": model_name,
+        "prompt": unicodedata.normalize("NFC", prompt).strip(),
+        "config": config or {},
+    }
+    return hashlib.sha256(
+        json.dumps(payload, sort_keys=True).encode("utf-8")
+    ).hexdigest()
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class ResponseCache(ABC):
+    """
+    Abstract Base Class for caching generated responses by cache key.
+    """
+
+    def __init__(self) -> None:
+        self.stats = CacheStats()
+        self._stats_lock = threading.Lock()
+
+    @abstractmethod
+    def _get(self, key: str) -> Optional[str]:
+        pass
+
+    @abstractmethod
+    def set(self, key: str, value: str) -> None:
+        """
+        Stores a response under `key`.
+        """
+        pass
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Returns the response cached under `key`, or None, counting hits and misses.
+        """
+        value = self._get(key)
+        with self._stats_lock:
+            if value is None:
+                self.stats.misses += 1
+            else:
+                self.stats.hits += 1
+        return value
+
+    async def aget(self, key: str) -> Optional[str]:
+        """
+        Async version of `get`. Backends doing I/O run it off the event loop.
+        """
+        return self.get(key)
+
+    async def aset(self, key: str, value: str) -> None:
+        """
+        Async version of `set`.
+        """
+        self.set(key, value)
+
+
+class InMemoryResponseCache(ResponseCache):
+    """
+    In-process LRU cache with a TTL, bounded by entry count and total size.
+
+    Args:
+        max_entries: Maximum number of responses kept.
+        max_bytes: Maximum total size of the kept responses, in UTF-8 bytes.
+        ttl: Seconds a response stays valid.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        max_bytes: int = 64 * 1024 * 1024,
+        ttl: float = 3600.0,
+    ) -> None:
+        super().__init__()
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, int, str]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def _drop(self, key: str) -> None:
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def _get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, _, value = entry
+            if expires_at <= time.monotonic():
+                self._drop(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str) -> None:
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.monotonic() + self.ttl, size, value)
+            self._bytes += size
+            # Evict least recently used entries until within bounds
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteResponseCache(ResponseCache):
+    """
+    Response cache in a local SQLite file, shared by the workers of a host.
+
+    Args:
+        path: The SQLite database file.
+        ttl: Seconds a response stays valid.
+    """
+
+    def __init__(self, path: str, ttl: float = 3600.0) -> None:
+        super().__init__()
+        self.path = Path(path)
+        self.ttl = ttl
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    def _get(self, key: str) -> Optional[str]:
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT value FROM responses WHERE key = ? AND expires_at > ?",
+                (key, time.time()),
+            ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, value: str) -> None:
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?)",
+                (key, value, time.time() + self.ttl),
+            )
+            # Drop expired responses now and then instead of on every read
+            if random.random() < 0.01:
+                conn.execute(
+                    "DELETE FROM responses WHERE expires_at <= ?", (time.time(),)
+                )
+
+    async def aget(self, key: str) -> Optional[str]:
+        return await asyncio.to_thread(self.get, key)
+
+    async def aset(self, key: str, value: str) -> None:
+        await asyncio.to_thread(self.set, key, value)
+
+
+class RedisResponseCache(ResponseCache):
+    """
+    Response cache in Redis or any Redis-compatible server (e.g. fakeredis).
+
+    Args:
+        client: A `redis.Redis`-compatible client.
+        ttl: Seconds a response stays valid.
+        prefix: Prefix of the keys written.
+    """
+
+    def __init__(
+        self, client: Any, ttl: float = 3600.0, prefix: str = "response:"
+    ) -> None:
+        super().__init__()
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def _get(self, key: str) -> Optional[str]:
+        value = self.client.get(self.prefix + key)
+        return value.decode("utf-8") if isinstance(value, bytes) else value
+
+    def set(self, key: str, value: str) -> None:
+        self.client.set(self.prefix + key, value, ex=max(1, int(self.ttl)))
+
+    async def aget(self, key: str) -> Optional[str]:
+        return await asyncio.to_thread(self.get, key)
+
+    async def aset(self, key: str, value: str) -> None:
+        await asyncio.to_thread(self.set, key, value)
+
+
+class TieredResponseCache(ResponseCache):
+    """
+    An in-process cache in front of a shared one.
+
+    Reads try the local cache first and fill it from the shared one; writes go
+    to both.
+    """
+
+    def __init__(self, local: ResponseCache, shared: ResponseCache) -> None:
+        super().__init__()
+        self.local = local
+        self.shared = shared
+
+    def _get(self, key: str) -> Optional[str]:
+        value = self.local.get(key)
+        if value is None:
+            value = self.shared.get(key)
+            if value is not None:
+                self.local.set(key, value)
+        return value
+
+    def set(self, key: str, value: str) -> None:
+        self.local.set(key, value)
+        self.shared.set(key, value)
+
+    async def aget(self, key: str) -> Optional[str]:
+        value = self.local.get(key)
+        if value is None:
+            value = await self.shared.aget(key)
+            if value is not None:
+                self.local.set(key, value)
+        with self._stats_lock:
+            if value is None:
+                self.stats.misses += 1
+            else:
+                self.stats.hits += 1
+        return value
+
+    async def aset(self, key: str, value: str) -> None:
+        self.local.set(key, value)
+        await self.shared.aset(key, value)
+
+
+def build_response_cache(
+    backend: str = "memory",
+    ttl: float = 3600.0,
+    max_entries: int = 1024,
+    max_bytes: int = 64 * 1024 * 1024,
+    url: Optional[str] = None,
+    namespace: str = "responses",
+) -> Optional[ResponseCache]:
+    """
+    Builds the response cache for a backend name.
+
+    Args:
+        backend: "none", "memory", "sqlite" (in-process LRU in front of an SQLite
+            file at `url`) or "redis" (in-process LRU in front of the Redis server
+            at `url`).
+        ttl: Seconds a response stays valid.
+        max_entries: Maximum number of responses kept in process.
+        max_bytes: Maximum total size of the responses kept in process.
+        url: Location of the shared backend.
+        namespace: Name of the cached responses, used for the default SQLite
+            file and the Redis key prefix, so several caches can share a host.
+    """
+    if backend == "none":
+        return None
+    local = InMemoryResponseCache(max_entries=max_entries, max_bytes=max_bytes, ttl=ttl)
+    if backend == "memory":
+        return local
+    if backend == "sqlite":
+        return TieredResponseCache(
+            local, SQLiteResponseCache(url or f"{namespace}.sqlite", ttl=ttl)
+        )
+    if backend == "redis":
+        import redis
+
+        client = redis.Redis.from_url(url or "redis://localhost:6379/0")
+        return TieredResponseCache(
+            local, RedisResponseCache(client, ttl=ttl, prefix=f"{namespace}:")
+        )
+    raise ValueError(f"Unknown response cache backend: {backend}")
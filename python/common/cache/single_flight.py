@@ -0,0 +1,64 @@
+import asyncio
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+@dataclass
+class SingleFlightStats:
+    # Calls that ran the function
+    leaders: int = 0
+    # Calls that shared the result of an identical call already in flight
+    collapsed: int = 0
+    # Collapsed calls that stopped waiting and ran the function themselves
+    timeouts: int = 0
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key into one.
+
+    The first call for a key runs the function; calls with that key made while
+    it is in flight wait for its result (or exception) instead of running it
+    again. The shared call is shielded, so it completes for the other callers
+    even if the one that started it is cancelled.
+
+    Args:
+        timeout: Seconds a collapsed call waits for the shared result before
+            running the function itself; waits as long as needed if None.
+    """
+
+    def __init__(self, timeout: Optional[float] = None) -> None:
+        self.timeout = timeout
+        self.stats = SingleFlightStats()
+        self._in_flight: Dict[str, asyncio.Future] = {}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> Tuple[T, bool]:
+        """
+        Returns the result of `fn()`, shared with concurrent calls for `key`,
+        and whether it was shared from another call.
+        """
+        shared = self._in_flight.get(key)
+        if shared is None:
+            self.stats.leaders += 1
+            task = asyncio.ensure_future(fn())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+            return await asyncio.shield(task), False
+
+        self.stats.collapsed += 1
+        try:
+            return await asyncio.wait_for(asyncio.shield(shared), self.timeout), True
+        except asyncio.TimeoutError:
+            self.stats.timeouts += 1
+            return await fn(), False
+
+    def _forget(self, key: str, done: asyncio.Future) -> None:
+        self._in_flight.pop(key, None)
+        # Retrieve the exception, which no caller may be left to await
+        if not done.cancelled():
+            done.exception()
+
+    def __len__(self) -> int:
+        return len(self._in_flight)
@@ -1,10 +1,28 @@
+from typing import Callable, Optional
+
 from fastapi import FastAPI
 
+from python.common.m_fastAPI.metrics import MetricsMiddleware, metrics_endpoint
+
 
-def create_base_app(root_path: str = "") -> FastAPI:
+def create_base_app(
+    root_path: str = "", lifespan: Optional[Callable] = None, metrics: bool = True
+) -> FastAPI:
     """
     Creates a base FastAPI application with common configuration and endpoints.
+
+    Args:
+        root_path: Root path the app is served under.
+        lifespan: Optional lifespan context manager, e.g. to close pooled clients on shutdown.
+        metrics: Whether to record request metrics and serve all registered
+            Prometheus metrics at `/metrics`.
     """
-    app = FastAPI(root_path=root_path)
+    app = FastAPI(root_path=root_path, lifespan=lifespan)
+
+    if metrics:
+        app.add_middleware(MetricsMiddleware, fastapi_app=app)
+        app.add_api_route(
+            "/metrics", metrics_endpoint, methods=["GET"], include_in_schema=False
+        )
 
     return app
@@ -0,0 +1,102 @@
+import time
+from typing import Any, Callable, Dict
+
+from fastapi import FastAPI, Request, Response
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from python.common.observability.metrics import LATENCY_BUCKETS
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Duration of HTTP requests, until the last byte of the response",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests being served")
+
+# Route label of requests matching no route, so unknown paths add no label sets
+UNMATCHED_ROUTE = "unmatched"
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording the latency and number in flight of HTTP requests.
+
+    Requests are labeled with their route's path template rather than their
+    path. The histogram child of each (method, route, status) is bound on first
+    use and looked up in nested dicts afterwards, so recording builds no label
+    tuples.
+    """
+
+    def __init__(self, app: ASGIApp, fastapi_app: FastAPI) -> None:
+        self.app = app
+        self.fastapi_app = fastapi_app
+        self._route_paths: Dict[Callable, str] = {}
+        self._children: Dict[Any, Dict[str, Dict[int, Any]]] = {}
+
+    def _route_path(self, endpoint: Any) -> str:
+        if endpoint is None:
+            return UNMATCHED_ROUTE
+        path = self._route_paths.get(endpoint)
+        if path is None:
+            # Routes may have been added since the last lookup
+            self._route_paths = {
+                route.endpoint: route.path
+                for route in self.fastapi_app.routes
+                if hasattr(route, "endpoint")
+            }
+            path = self._route_paths.get(endpoint, UNMATCHED_ROUTE)
+        return path
+
+    def _child(self, endpoint: Any, method: str, status: int) -> Any:
+        by_method = self._children.get(endpoint)
+        if by_method is None:
+            by_method = self._children.setdefault(endpoint, {})
+        by_status = by_method.get(method)
+        if by_status is None:
+            by_status = by_method.setdefault(method, {})
+        child = by_status.get(status)
+        if child is None:
+            child = by_status.setdefault(
+                status,
+                HTTP_REQUEST_DURATION.labels(
+                    method, self._route_path(endpoint), str(status)
+                ),
+            )
+        return child
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_REQUESTS_IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_REQUESTS_IN_FLIGHT.dec()
+            # The router sets the matched endpoint in the shared scope
+            self._child(scope.get("endpoint"), scope["method"], status).observe(
+                time.perf_counter() - start
+            )
+
+
+def metrics_endpoint(request: Request) -> Response:
+    """Serves every registered metric in the Prometheus text format."""
+    return Response(generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
@@ -1,10 +1,16 @@
+import json
 import logging
+import threading
 from contextlib import contextmanager
-from typing import Any, Generator
+from typing import Any, Dict, Generator, Iterable, List, Optional
 
-from langfuse import Langfuse
+from langfuse import Langfuse, LangfuseOtelSpanAttributes
 from openinference.instrumentation.google_genai import GoogleGenAIInstrumentor
+from opentelemetry import metrics
+from opentelemetry import trace as otel_trace
 
+from .prompt_cache import PromptCache
+from .span_exporter import DROP_NEWEST, BackgroundSpanExporter, ExportStats, SpanRecord, truncate_payload
 from .tracer_interface import TracerInterface
 
 # Configure a specific logger for this module
@@ -17,20 +23,155 @@ handler.setFormatter(
 logger.addHandler(handler)
 
 
+def _serialize(value: Any) -> Optional[str]:
+    if value is None or isinstance(value, str):
+        return value
+    return json.dumps(value, default=str)
+
+
 class LangfuseTracer(TracerInterface):
     """
     Implementation of TracerInterface using Langfuse and OpenInference.
     """
 
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        prompt_cache_ttl: float = 60.0,
+        preload_prompts: Iterable[str] = (),
+        async_export: bool = False,
+        export_queue_size: int = 10000,
+        export_policy: str = DROP_NEWEST,
+        max_payload_size: Optional[int] = 64 * 1024,
+    ) -> None:
+        """
+        Args:
+            prompt_cache_ttl: Seconds a managed prompt is served from the local
+                cache before it is refreshed in the background.
+            preload_prompts: Names of managed prompts to fetch at startup.
+            async_export: Record spans in memory and create them in Langfuse on
+                a background thread, instead of on the request thread.
+            export_queue_size: Maximum number of traces waiting for export with
+                `async_export`.
+            export_policy: What to do with a trace when the export queue is
+                full; see `BackgroundSpanExporter`.
+            max_payload_size: With `async_export`, inputs, outputs and metadata
+                longer than this many characters (as JSON) are truncated on
+                export; never if None.
+        """
         logger.info("Initializing LangfuseTracer")
         self.langfuse = Langfuse()
+        self.max_payload_size = max_payload_size
+        # Langfuse's processor is registered on the global tracer provider (its
+        # own, unless one was set before), so spans of any tracer reach it
+        self._otel_tracer = otel_trace.get_tracer("langfuse_tracer")
+        self.exporter = (
+            BackgroundSpanExporter(self._export, max_queue_size=export_queue_size, policy=export_policy)
+            if async_export
+            else None
+        )
+
+        # Prompts are cached here, so bypass the SDK's own cache when fetching
+        self.prompts = PromptCache(
+            lambda name: self.langfuse.get_prompt(name, cache_ttl_seconds=0),
+            ttl=prompt_cache_ttl,
+        )
+        self.prompts.preload(preload_prompts)
 
         # Initialize automatic instrumentation for Google GenAI
         # This will automatically capture calls made via the google-genai SDK
         GoogleGenAIInstrumentor().instrument()
         logger.info("Google GenAI instrumentation enabled")
 
+        # Metrics go to the globally configured OpenTelemetry meter provider
+        # (dropped if none is configured)
+        self._meter = metrics.get_meter("langfuse_tracer")
+        self._counters: Dict[str, Any] = {}
+        self._counters_lock = threading.Lock()
+
+    def _truncated(self, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        if self.max_payload_size is None:
+            return kwargs
+        return {
+            key: truncate_payload(value, self.max_payload_size) if key in ("input", "output", "metadata") else value
+            for key, value in kwargs.items()
+        }
+
+    @contextmanager
+    def _record(self, name: str, parent: Optional[SpanRecord], kwargs: Dict[str, Any]) -> Generator[SpanRecord, None, None]:
+        # Recording only keeps references to the payloads; they are truncated
+        # and serialized when exported
+        record = SpanRecord(name, kwargs, parent)
+        try:
+            yield record
+        except Exception as e:
+            record.update(level="ERROR", status_message=str(e))
+            raise
+        finally:
+            self.exporter.end(record)
+
+    def _span_attributes(self, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Langfuse's OpenTelemetry attributes for the arguments of a span or of an
+        update, e.g. input, output, metadata and level.
+        """
+        kwargs = self._truncated(kwargs)
+        attributes = {
+            LangfuseOtelSpanAttributes.OBSERVATION_LEVEL: kwargs.get("level"),
+            LangfuseOtelSpanAttributes.OBSERVATION_STATUS_MESSAGE: kwargs.get("status_message"),
+            LangfuseOtelSpanAttributes.VERSION: kwargs.get("version"),
+            LangfuseOtelSpanAttributes.OBSERVATION_INPUT: _serialize(kwargs.get("input")),
+            LangfuseOtelSpanAttributes.OBSERVATION_OUTPUT: _serialize(kwargs.get("output")),
+        }
+        metadata = kwargs.get("metadata")
+        if isinstance(metadata, dict):
+            # One attribute per key, so updates merge into earlier metadata
+            for key, value in metadata.items():
+                attributes[f"{LangfuseOtelSpanAttributes.OBSERVATION_METADATA}.{key}"] = (
+                    value if isinstance(value, (str, int)) else _serialize(value)
+                )
+        else:
+            attributes[LangfuseOtelSpanAttributes.OBSERVATION_METADATA] = _serialize(metadata)
+        return {key: value for key, value in attributes.items() if value is not None}
+
+    def _export_record(self, record: SpanRecord, parent: Any) -> None:
+        # Langfuse's span API cannot backdate a span, so create it through
+        # OpenTelemetry with the recorded times and Langfuse's attributes
+        attributes = {LangfuseOtelSpanAttributes.OBSERVATION_TYPE: "span", **self._span_attributes(record.kwargs)}
+        for update in record.updates:
+            attributes.update(self._span_attributes(update))
+        context = otel_trace.set_span_in_context(parent) if parent is not None else None
+        otel_span = self._otel_tracer.start_span(
+            name=record.name, context=context, start_time=record.start_ns, attributes=attributes
+        )
+        record.exported = otel_span
+        for child in record.children:
+            self._export_record(child, otel_span)
+        otel_span.end(end_time=record.end_ns)
+
+    def _export(self, records: List[SpanRecord]) -> None:
+        for record in records:
+            # A child ending after its parent is exported on its own, under the
+            # already exported parent; the exporter drops it if its parent was dropped
+            self._export_record(record, record.parent.exported if record.parent is not None else None)
+
+    def replay(self, record: SpanRecord) -> None:
+        """
+        Creates the spans of a tree that already ended in Langfuse, with their
+        recorded times: queued for export with `async_export`, else right away.
+
+        Args:
+            record: The root span of the tree.
+        """
+        if self.exporter is not None:
+            self.exporter.submit(record)
+        else:
+            self._export_record(record, None)
+
+    @property
+    def export_stats(self) -> Optional[ExportStats]:
+        """Exported and dropped span counts with `async_export`, else None."""
+        return self.exporter.stats if self.exporter is not None else None
+
     @contextmanager
     def trace(self, name: str, **kwargs) -> Generator[Any, None, None]:
         """
@@ -40,6 +181,11 @@ class LangfuseTracer(TracerInterface):
             name: The name of the trace.
             **kwargs: Additional arguments passed to Langfuse.
         """
+        if self.exporter is not None:
+            with self._record(name, None, kwargs) as record:
+                yield record
+            return
+
         trace = self.langfuse.start_span(name=name, **kwargs)
         logger.debug(f"Started trace: {name} with kwargs: {kwargs}")
         try:
@@ -51,15 +197,24 @@ class LangfuseTracer(TracerInterface):
             trace.end()
 
     @contextmanager
-    def span(self, name: str, **kwargs) -> Generator[Any, None, None]:
+    def span(self, name: str, parent: Any = None, **kwargs) -> Generator[Any, None, None]:
         """
         Creates a child span within a trace.
 
         Args:
             name: The name of the span.
+            parent: The Langfuse span to nest the span under.
             **kwargs: Additional arguments passed to Langfuse.
         """
-        span = self.langfuse.start_span(name=name, **kwargs)
+        if self.exporter is not None:
+            with self._record(name, parent, kwargs) as record:
+                yield record
+            return
+
+        if parent is not None:
+            span = parent.start_span(name=name, **kwargs)
+        else:
+            span = self.langfuse.start_span(name=name, **kwargs)
         logger.debug(f"Started span: {name} with kwargs: {kwargs}")
         try:
             yield span
@@ -71,15 +226,44 @@ class LangfuseTracer(TracerInterface):
 
     def get_prompt(self, name: str) -> Any:
         """
-        Retrieves a managed prompt from Langfuse.
+        Retrieves a managed prompt from Langfuse, through the local prompt cache.
 
         Args:
             name: The name of the prompt to retrieve.
         """
-        return self.langfuse.get_prompt(name)
+        return self.prompts.get(name)
+
+    async def aget_prompt(self, name: str) -> Any:
+        """
+        Async version of `get_prompt`; a fetch of the prompt is awaited without
+        blocking the event loop.
+
+        Args:
+            name: The name of the prompt to retrieve.
+        """
+        return await self.prompts.aget(name)
+
+    def record_metric(self, name: str, value: float = 1, **attributes) -> None:
+        """
+        Adds `value` to the OpenTelemetry counter `name`.
+
+        Args:
+            name: The name of the counter.
+            value: The amount to add.
+            **attributes: Attributes of the data point.
+        """
+        counter = self._counters.get(name)
+        if counter is None:
+            with self._counters_lock:
+                counter = self._counters.setdefault(name, self._meter.create_counter(name))
+        counter.add(value, attributes=attributes or None)
 
     def shutdown(self) -> None:
         """Flushes pending events and shuts down the tracer."""
+        self.prompts.shutdown()
+        if self.exporter is not None:
+            self.exporter.flush()
+            logger.info(f"Span export: {self.exporter.stats}")
         logger.info("Flushing Langfuse events...")
         self.langfuse.flush()
         logger.info("Langfuse flushed.")
@@ -0,0 +1,63 @@
+from typing import Callable, Dict, Iterable, Optional
+
+from prometheus_client import Histogram
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from prometheus_client.registry import Collector
+
+# Buckets from 5 ms to 2 minutes, covering both local endpoints and LLM calls
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+UPSTREAM_DURATION = Histogram(
+    "llm_upstream_duration_seconds",
+    "Duration of upstream LLM calls, until the last token for streams",
+    ["model", "operation"],
+    buckets=LATENCY_BUCKETS,
+)
+TIME_TO_FIRST_TOKEN = Histogram(
+    "llm_time_to_first_token_seconds",
+    "Time from the start of a streamed LLM call to its first token",
+    ["model"],
+    buckets=LATENCY_BUCKETS,
+)
+
+
+class CallbackCollector(Collector):
+    """
+    Metrics read from callbacks when scraped, e.g. from stats counters and queue
+    lengths the code keeps anyway, so they cost nothing until scraped.
+
+    Args:
+        gauges: Gauge callbacks by metric name, each returning a value per
+            label value of `label`, or a single value (keyed by None).
+        counters: Counter callbacks, the same way.
+        label: Name of the label of multi-valued metrics.
+        documentation: Help text by metric name.
+    """
+
+    def __init__(
+        self,
+        gauges: Optional[Dict[str, Callable[[], Dict[Optional[str], float]]]] = None,
+        counters: Optional[Dict[str, Callable[[], Dict[Optional[str], float]]]] = None,
+        label: str = "result",
+        documentation: Optional[Dict[str, str]] = None,
+    ) -> None:
+        self.gauges = gauges or {}
+        self.counters = counters or {}
+        self.label = label
+        self.documentation = documentation or {}
+
+    def _families(self, family, callbacks) -> Iterable:
+        for name, callback in callbacks.items():
+            values = callback()
+            labeled = any(key is not None for key in values)
+            metric = family(name, self.documentation.get(name, name), labels=[self.label] if labeled else None)
+            for key, value in values.items():
+                if labeled:
+                    metric.add_metric([key], value)
+                else:
+                    metric.add_metric([], value)
+            yield metric
+
+    def collect(self) -> Iterable:
+        yield from self._families(GaugeMetricFamily, self.gauges)
+        yield from self._families(CounterMetricFamily, self.counters)
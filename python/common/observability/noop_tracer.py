@@ -1,5 +1,5 @@
 from contextlib import contextmanager
-from typing import Generator
+from typing import Any, Generator
 
 from .tracer_interface import TracerInterface
 
@@ -30,7 +30,7 @@ class NoOpTracer(TracerInterface):
         yield None
 
     @contextmanager
-    def span(self, name: str, **kwargs) -> Generator[None, None, None]:
+    def span(self, name: str, parent: Any = None, **kwargs) -> Generator[None, None, None]:
         """No-op span context manager."""
         yield None
 
@@ -38,6 +38,10 @@ class NoOpTracer(TracerInterface):
         """Returns a DummyPrompt as fallback."""
         return DummyPrompt(name)
 
+    async def aget_prompt(self, name: str) -> DummyPrompt:
+        """Returns a DummyPrompt as fallback."""
+        return DummyPrompt(name)
+
     def shutdown(self) -> None:
         """No-op shutdown."""
         pass
@@ -0,0 +1,170 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger("prompt_cache")
+
+
+class CachedPrompt:
+    """
+    Wraps a managed prompt, memoizing its compiled text per set of variables.
+
+    Every other attribute is read from the wrapped prompt.
+
+    Args:
+        prompt: The prompt object, with a `compile(**kwargs)` method.
+        max_compiled: Maximum number of compiled texts kept.
+    """
+
+    def __init__(self, prompt: Any, max_compiled: int = 256) -> None:
+        self.prompt = prompt
+        self.max_compiled = max_compiled
+        self._compiled: "OrderedDict[Any, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def compile(self, **kwargs) -> Any:
+        try:
+            key = tuple(sorted(kwargs.items()))
+            hash(key)
+        except TypeError:
+            # Unhashable variables (e.g. chat message lists) are compiled every time
+            return self.prompt.compile(**kwargs)
+        with self._lock:
+            if key in self._compiled:
+                self._compiled.move_to_end(key)
+                return self._compiled[key]
+        compiled = self.prompt.compile(**kwargs)
+        with self._lock:
+            self._compiled[key] = compiled
+            while len(self._compiled) > self.max_compiled:
+                self._compiled.popitem(last=False)
+        return compiled
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.prompt, name)
+
+
+@dataclass
+class _Entry:
+    prompt: Optional[CachedPrompt] = None
+    fetched_at: float = 0.0
+    error: Optional[Exception] = None
+    refresh: Optional[Future] = field(default=None, repr=False)
+
+
+class PromptCache:
+    """
+    Local cache of managed prompts with stale-while-revalidate refresh.
+
+    A prompt younger than `ttl` is served from memory. An older one is still
+    served right away while a background thread fetches the new version, so
+    only the first fetch of a prompt blocks; preloading prompts at startup
+    takes that off the request path too. A failed refresh keeps the stale
+    prompt, and a failed first fetch is remembered for `error_ttl` so
+    callers fall back immediately instead of waiting on the prompt service
+    every time.
+
+    Args:
+        fetch: Fetches a prompt by name from the prompt service.
+        ttl: Seconds a fetched prompt is served without refreshing it.
+        error_ttl: Seconds a failed first fetch is re-raised without retrying.
+        max_workers: Number of background refresh threads.
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[str], Any],
+        ttl: float = 60.0,
+        error_ttl: float = 5.0,
+        max_workers: int = 2,
+    ) -> None:
+        self.fetch = fetch
+        self.ttl = ttl
+        self.error_ttl = error_ttl
+        self._entries: Dict[str, _Entry] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="prompt-refresh")
+
+    def _load(self, name: str) -> CachedPrompt:
+        try:
+            prompt = CachedPrompt(self.fetch(name))
+        except Exception as e:
+            with self._lock:
+                entry = self._entries.setdefault(name, _Entry())
+                entry.refresh = None
+                if entry.prompt is None:
+                    entry.error = e
+                    entry.fetched_at = time.monotonic()
+                else:
+                    # Retry the refresh after `error_ttl` rather than on every request
+                    entry.fetched_at = time.monotonic() - self.ttl + self.error_ttl
+            if entry.prompt is not None:
+                logger.warning(f"Refreshing prompt {name} failed, serving the cached version: {e}")
+            raise
+        with self._lock:
+            self._entries[name] = _Entry(prompt=prompt, fetched_at=time.monotonic())
+        return prompt
+
+    def _lookup(self, name: str, fetch: bool) -> Tuple[Optional[CachedPrompt], Optional[Future]]:
+        """
+        Returns the cached prompt `name`, or else the pending fetch of it, if any.
+
+        Starts refreshing a stale prompt in the background, and with `fetch` also
+        the first fetch of a missing one. Re-raises a first fetch that failed
+        less than `error_ttl` ago.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None and entry.prompt is not None:
+                if now - entry.fetched_at >= self.ttl and entry.refresh is None:
+                    entry.refresh = self._executor.submit(self._load, name)
+                return entry.prompt, None
+            if entry is not None and entry.error is not None and now - entry.fetched_at < self.error_ttl:
+                raise entry.error
+            if fetch and (entry is None or entry.refresh is None):
+                entry = self._entries.setdefault(name, _Entry())
+                entry.refresh = self._executor.submit(self._load, name)
+            return None, entry.refresh if entry is not None else None
+
+    def get(self, name: str) -> CachedPrompt:
+        """
+        Returns the prompt `name`, fetching it only if it was never fetched.
+        """
+        prompt, pending = self._lookup(name, fetch=False)
+        if prompt is not None:
+            return prompt
+        if pending is not None:
+            # A preload of this prompt is under way; wait for it rather than fetching twice
+            return pending.result()
+        return self._load(name)
+
+    async def aget(self, name: str) -> CachedPrompt:
+        """
+        Async version of `get`, which waits for a fetch without blocking the event loop.
+        """
+        prompt, pending = self._lookup(name, fetch=True)
+        if prompt is not None:
+            return prompt
+        return await asyncio.wrap_future(pending)
+
+    def preload(self, names: Iterable[str]) -> List[Future]:
+        """
+        Starts fetching `names` in the background and returns their futures.
+        """
+        futures = []
+        with self._lock:
+            for name in names:
+                entry = self._entries.setdefault(name, _Entry())
+                if entry.refresh is None:
+                    entry.refresh = self._executor.submit(self._load, name)
+                futures.append(entry.refresh)
+        return futures
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,172 @@
+import random
+import threading
+import time
+from typing import Any, ContextManager, Dict, List, Optional
+
+from .span_exporter import SpanRecord
+from .tracer_interface import TracerInterface
+
+
+class UnsampledSpan:
+    """
+    Stands in for the span of unsampled work, as its own context manager.
+
+    Costs about as little as `NoOpTracer`'s spans, but remembers its times,
+    updates and ended children, so the whole trace can still be replayed through
+    `tracer` if any of its spans turns out to fail.
+    """
+
+    __slots__ = ("tracer", "name", "kwargs", "updates", "parent", "children", "start_ns", "end_ns", "failed", "closed")
+
+    def __init__(
+        self, tracer: TracerInterface, name: str, kwargs: Dict[str, Any], parent: Optional["UnsampledSpan"] = None
+    ) -> None:
+        self.tracer = tracer
+        self.name = name
+        self.kwargs = kwargs
+        self.updates: List[Dict[str, Any]] = []
+        self.parent = parent
+        self.children: List["UnsampledSpan"] = []
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        # Set when this span or one of its descendants failed
+        self.failed = False
+        self.closed = False
+
+    def update(self, **kwargs) -> None:
+        self.updates.append(kwargs)
+        if kwargs.get("level") == "ERROR":
+            self.failed = True
+
+    def __enter__(self) -> "UnsampledSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        if isinstance(exc, Exception):
+            self.update(level="ERROR", status_message=str(exc))
+        self.end_ns = time.time_ns()
+        self.closed = True
+        parent = self.parent
+        if parent is not None and not parent.closed:
+            # The root decides for the whole trace when it ends
+            parent.children.append(self)
+            if self.failed:
+                parent.failed = True
+        elif self.failed:
+            # Trace failures after the fact, with what the spans recorded. A
+            # span ending after its parent is replayed on its own.
+            self.tracer.replay(self.to_record())
+        return False
+
+    def to_record(self, parent: Optional[SpanRecord] = None) -> SpanRecord:
+        """The span and its ended children, as a tree of `SpanRecord`s."""
+        record = SpanRecord(self.name, self.kwargs, parent)
+        record.updates = self.updates
+        record.start_ns = self.start_ns
+        record.end_ns = self.end_ns
+        record.closed = True
+        record.children = [child.to_record(record) for child in self.children]
+        return record
+
+
+class SamplingTracer(TracerInterface):
+    """
+    Traces a sample of the work through another tracer.
+
+    Sampling is decided when a trace starts (head-based): with the ratio set
+    for its name, then within a limit of traces per second. Spans follow the
+    decision of their parent. Unsampled work gets an `UnsampledSpan`; if any
+    span of an unsampled trace raises, or is updated with level "ERROR", the
+    trace is replayed through the wrapped tracer with its recorded timings.
+
+    Args:
+        tracer: The tracer sampled work is traced with.
+        ratios: Ratio of traces sampled, by trace name.
+        default_ratio: Ratio of traces sampled for names not in `ratios`.
+        max_traces_per_second: Limit of sampled traces per second, with bursts
+            of up to as many (at least one); unlimited if None.
+    """
+
+    def __init__(
+        self,
+        tracer: TracerInterface,
+        ratios: Optional[Dict[str, float]] = None,
+        default_ratio: float = 1.0,
+        max_traces_per_second: Optional[float] = None,
+    ) -> None:
+        self.tracer = tracer
+        self.ratios = dict(ratios or {})
+        self.default_ratio = default_ratio
+        self.max_traces_per_second = max_traces_per_second
+        # Allow bursts of at least one trace, also below one trace per second
+        self._burst = max(1.0, max_traces_per_second or 0.0)
+        self._tokens = self._burst
+        self._refilled_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _take_token(self) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self._burst,
+                self._tokens + (now - self._refilled_at) * self.max_traces_per_second,
+            )
+            self._refilled_at = now
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+    def should_sample(self, name: str) -> bool:
+        """Decides whether a trace named `name` is sampled."""
+        ratio = self.ratios.get(name, self.default_ratio)
+        if ratio < 1 and (ratio <= 0 or random.random() >= ratio):
+            return False
+        return self.max_traces_per_second is None or self._take_token()
+
+    def trace(self, name: str, **kwargs) -> ContextManager[Any]:
+        """
+        Starts a trace through the wrapped tracer if sampled.
+
+        Args:
+            name: The name of the trace.
+            **kwargs: Additional arguments for the wrapped tracer.
+        """
+        if self.should_sample(name):
+            return self.tracer.trace(name, **kwargs)
+        return UnsampledSpan(self.tracer, name, kwargs)
+
+    def span(self, name: str, parent: Any = None, **kwargs) -> ContextManager[Any]:
+        """
+        Creates a span through the wrapped tracer if its parent is sampled, or,
+        without a parent, if it is sampled itself.
+
+        Args:
+            name: The name of the span.
+            parent: The trace or span to nest the span under.
+            **kwargs: Additional arguments for the wrapped tracer.
+        """
+        if isinstance(parent, UnsampledSpan):
+            return UnsampledSpan(self.tracer, name, kwargs, parent)
+        if parent is None and not self.should_sample(name):
+            return UnsampledSpan(self.tracer, name, kwargs)
+        return self.tracer.span(name, parent=parent, **kwargs)
+
+    def get_prompt(self, name: str) -> Any:
+        return self.tracer.get_prompt(name)
+
+    async def aget_prompt(self, name: str) -> Any:
+        return await self.tracer.aget_prompt(name)
+
+    def replay(self, record: SpanRecord) -> None:
+        self.tracer.replay(record)
+
+    def record_metric(self, name: str, value: float = 1, **attributes) -> None:
+        self.tracer.record_metric(name, value, **attributes)
+
+    def shutdown(self) -> None:
+        self.tracer.shutdown()
+
+    def __getattr__(self, name: str) -> Any:
+        # Expose the wrapped tracer's extras, e.g. `export_stats`
+        return getattr(self.tracer, name)
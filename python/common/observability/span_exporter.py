@@ -0,0 +1,219 @@
+import json
+import logging
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger("span_exporter")
+
+# What to do with a span when the export queue is full
+DROP_NEWEST = "drop_newest"
+DROP_OLDEST = "drop_oldest"
+BLOCK = "block"
+
+
+class SpanRecord:
+    """
+    A span recorded in memory, to be exported later.
+
+    Yielded in place of the tracing backend's span: `update` only appends to a
+    list, so recording costs the same whatever the size of the payloads.
+    """
+
+    __slots__ = (
+        "name",
+        "kwargs",
+        "updates",
+        "parent",
+        "start_ns",
+        "end_ns",
+        "children",
+        "closed",
+        "dropped",
+        "exported",
+        "_lock",
+    )
+
+    def __init__(self, name: str, kwargs: Dict[str, Any], parent: Optional["SpanRecord"] = None) -> None:
+        self.name = name
+        self.kwargs = kwargs
+        self.updates: List[Dict[str, Any]] = []
+        self.parent = parent
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.children: List["SpanRecord"] = []
+        self.closed = False
+        # Set when the span is dropped or fails to export, so children ending later are dropped with it
+        self.dropped = False
+        # The exported span, set by the exporter for children that end later
+        self.exported: Any = None
+        self._lock = threading.Lock()
+
+    def update(self, **kwargs) -> None:
+        self.updates.append(kwargs)
+
+    def size(self) -> int:
+        """Number of spans in this span's tree."""
+        return 1 + sum(child.size() for child in self.children)
+
+
+def truncate_payload(value: Any, max_size: int) -> Any:
+    """
+    Returns `value`, or its JSON text cut to `max_size` characters if longer.
+    """
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    text = value if isinstance(value, str) else json.dumps(value, default=str)
+    if len(text) <= max_size:
+        return value
+    return f"{text[:max_size]}... [truncated {len(text) - max_size} characters]"
+
+
+@dataclass
+class ExportStats:
+    exported: int = 0
+    dropped: int = 0
+    failed: int = 0
+
+
+class BackgroundSpanExporter:
+    """
+    Exports recorded spans from a bounded queue on a background thread.
+
+    A span joins the queue when it ends, together with the children that ended
+    before it; children ending after their parent join on their own, behind it,
+    and are dropped with it if it never gets exported. A thread drains the
+    queue in batches of up to `batch_size`, every `flush_interval` seconds or as
+    soon as a batch is full.
+
+    Args:
+        export: Exports a batch of span trees.
+        max_queue_size: Maximum number of span trees waiting for export.
+        policy: When the queue is full, DROP_NEWEST drops the ending span,
+            DROP_OLDEST drops the longest waiting one, and BLOCK makes the
+            ending span wait up to `block_timeout` seconds for room (applying
+            backpressure to the caller, which blocks its thread and, in async
+            code, its event loop) before dropping it.
+        batch_size: Maximum number of span trees exported at once.
+        flush_interval: Seconds between exports of a partial batch.
+        block_timeout: Longest wait for room in the queue with BLOCK.
+    """
+
+    def __init__(
+        self,
+        export: Callable[[List[SpanRecord]], None],
+        max_queue_size: int = 10000,
+        policy: str = DROP_NEWEST,
+        batch_size: int = 256,
+        flush_interval: float = 1.0,
+        block_timeout: float = 0.1,
+    ) -> None:
+        if policy not in (DROP_NEWEST, DROP_OLDEST, BLOCK):
+            raise ValueError(f"Unknown span export policy: {policy}")
+        self.export = export
+        self.max_queue_size = max_queue_size
+        self.policy = policy
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.block_timeout = block_timeout
+        self.stats = ExportStats()
+        self._queue: deque = deque()
+        # Guards the queue; notified whenever the exporter makes room in it
+        self._room = threading.Condition()
+        self._wake = threading.Event()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+        self._thread.start()
+
+    def end(self, record: SpanRecord) -> None:
+        """Ends a span and queues it, or attaches it to its still open parent."""
+        record.end_ns = time.time_ns()
+        parent = record.parent
+        if parent is not None:
+            with parent._lock:
+                if not parent.closed:
+                    parent.children.append(record)
+                    return
+        # Closed and queued under the span's lock, so children ending later queue behind it
+        with record._lock:
+            record.closed = True
+            self._enqueue(record)
+
+    def submit(self, record: SpanRecord) -> None:
+        """Queues a span tree that already ended, with its recorded times."""
+        with record._lock:
+            record.closed = True
+            self._enqueue(record)
+
+    def _orphaned(self, record: SpanRecord) -> bool:
+        return record.parent is not None and record.parent.dropped
+
+    def _enqueue(self, record: SpanRecord) -> None:
+        with self._room:
+            if self._orphaned(record):
+                self._drop(record)
+                return
+            if len(self._queue) >= self.max_queue_size:
+                if self.policy == DROP_OLDEST:
+                    self._drop(self._queue.popleft())
+                elif self.policy == BLOCK:
+                    self._wake.set()
+                    self._room.wait_for(
+                        lambda: len(self._queue) < self.max_queue_size or self._stopped, self.block_timeout
+                    )
+                if len(self._queue) >= self.max_queue_size:
+                    self._drop(record)
+                    return
+            self._queue.append(record)
+            if len(self._queue) >= self.batch_size:
+                self._wake.set()
+
+    def _drop(self, record: SpanRecord) -> None:
+        # Called with the queue's lock held
+        record.dropped = True
+        self.stats.dropped += record.size()
+
+    def _next_batch(self) -> List[SpanRecord]:
+        batch = []
+        with self._room:
+            while self._queue and len(batch) < self.batch_size:
+                record = self._queue.popleft()
+                if self._orphaned(record):
+                    self._drop(record)
+                else:
+                    batch.append(record)
+            self._room.notify_all()
+        return batch
+
+    def _drain(self) -> None:
+        while batch := self._next_batch():
+            spans = sum(record.size() for record in batch)
+            try:
+                self.export(batch)
+                self.stats.exported += spans
+            except Exception as e:
+                for record in batch:
+                    record.dropped = True
+                self.stats.failed += spans
+                logger.error(f"Exporting {spans} spans failed: {e}")
+
+    def _run(self) -> None:
+        while not self._stopped:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self._drain()
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._queue)
+
+    def flush(self) -> None:
+        """Exports every queued span and stops the background thread."""
+        with self._room:
+            self._stopped = True
+            self._room.notify_all()
+        self._wake.set()
+        self._thread.join()
+        self._drain()
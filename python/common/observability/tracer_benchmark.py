@@ -0,0 +1,357 @@
+"""
+Benchmark of tracing overhead, against a local fake Langfuse/OTLP collector.
+
+Measures, per tracer implementation and payload size, what one traced
+operation (a trace with a child span, each updated with an output) costs on
+the calling thread: p50/p99 latency, peak memory allocated and memory blocks
+left allocated. Then measures per-request latency and throughput at several
+concurrency levels, and the per-call cost of the MCP context propagation
+helpers (`with_otel_context_from_meta` and `TracedMCPServer`).
+
+Spans are exported to a local HTTP server standing in for Langfuse, so the
+numbers include the exporter's background work competing for the GIL, but no
+network. Span batches the OTLP exporter drops for exceeding its maximum request
+size (with the largest payloads, when spans are not truncated) are not exported
+at all; the run reports how many were dropped.
+
+To catch regressions in CI, save a baseline once and compare later runs to
+it; the run fails if any p50 got slower by more than the tolerance:
+
+    bazel run //python/common/observability:tracer_benchmark -- --save baseline.json
+    bazel run //python/common/observability:tracer_benchmark -- --baseline baseline.json --tolerance 0.5
+"""
+
+import argparse
+import asyncio
+import copy
+import gc
+import json
+import logging
+import os
+import statistics
+import sys
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List
+
+PAYLOAD_SIZES = [0, 1024, 64 * 1024, 1024 * 1024]
+CONCURRENCY_LEVELS = [1, 16, 64, 256]
+
+
+class FakeCollector(ThreadingHTTPServer):
+    """
+    Accepts any POST (OTLP span batches, Langfuse API calls) with a 200 and
+    counts the requests and bytes received.
+    """
+
+    daemon_threads = True
+
+    def __init__(self) -> None:
+        collector = self
+        self.requests = 0
+        self.bytes = 0
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self) -> None:
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                collector.requests += 1
+                collector.bytes += len(body)
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.end_headers()
+                self.wfile.write(b"{}")
+
+            do_GET = do_POST
+
+            def log_message(self, format: str, *args: Any) -> None:
+                pass
+
+        super().__init__(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class DroppedBatches(logging.Handler):
+    """Counts the span batches the OTLP exporter drops for exceeding its maximum request size."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.count = 0
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if "exceeds max_request_size" in record.getMessage():
+            self.count += 1
+
+
+def percentile(values: List[float], q: float) -> float:
+    values = sorted(values)
+    return values[int(q * (len(values) - 1))]
+
+
+def summarize(latencies_ns: List[int]) -> Dict[str, float]:
+    return {
+        "p50_us": statistics.median(latencies_ns) / 1000,
+        "p99_us": percentile(latencies_ns, 0.99) / 1000,
+        "mean_us": statistics.fmean(latencies_ns) / 1000,
+    }
+
+
+def traced_operation(tracer: Any, payload: str) -> None:
+    # What an endpoint does: a trace, a child span, and outputs on both
+    with tracer.trace(name="benchmark.request", input=payload) as trace:
+        with tracer.span(name="benchmark.span", parent=trace, input=payload) as span:
+            if span and hasattr(span, "update"):
+                span.update(output=payload)
+        if trace and hasattr(trace, "update"):
+            trace.update(output=payload, metadata={"payload_size": len(payload)})
+
+
+def measure_latency(operation: Callable[[], None], iterations: int) -> Dict[str, float]:
+    for _ in range(min(100, iterations)):
+        operation()
+    latencies = []
+    for _ in range(iterations):
+        start = time.perf_counter_ns()
+        operation()
+        latencies.append(time.perf_counter_ns() - start)
+    return summarize(latencies)
+
+
+def measure_memory(operation: Callable[[], None], iterations: int) -> Dict[str, float]:
+    """
+    Peak memory allocated by one operation, and memory blocks still allocated
+    per operation afterwards (e.g. spans waiting in an export queue).
+    """
+    operation()
+    gc.collect()
+    blocks_before = sys.getallocatedblocks()
+    tracemalloc.start()
+    peaks = []
+    for _ in range(iterations):
+        tracemalloc.reset_peak()
+        current, _ = tracemalloc.get_traced_memory()
+        operation()
+        peaks.append(tracemalloc.get_traced_memory()[1] - current)
+    tracemalloc.stop()
+    gc.collect()
+    return {
+        "peak_kib": statistics.median(peaks) / 1024,
+        "retained_blocks": (sys.getallocatedblocks() - blocks_before) / iterations,
+    }
+
+
+async def measure_concurrency(
+    tracer: Any, payload: str, concurrency: int, requests: int
+) -> Dict[str, float]:
+    """
+    Per-request latency and throughput of `requests` traced requests, run
+    `concurrency` at a time on one event loop, each yielding once midway like
+    an awaited upstream call.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[int] = []
+
+    async def request() -> None:
+        async with semaphore:
+            start = time.perf_counter_ns()
+            with tracer.trace(name="benchmark.request", input=payload) as trace:
+                await asyncio.sleep(0)
+                with tracer.span(
+                    name="benchmark.span", parent=trace, input=payload
+                ) as span:
+                    if span and hasattr(span, "update"):
+                        span.update(output=payload)
+                if trace and hasattr(trace, "update"):
+                    trace.update(output=payload)
+            latencies.append(time.perf_counter_ns() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(request() for _ in range(requests)))
+    elapsed = time.perf_counter() - start
+    return {**summarize(latencies), "requests_per_s": requests / elapsed}
+
+
+def build_tracers() -> Dict[str, Any]:
+    from python.common.observability.langfuse_tracer import LangfuseTracer
+    from python.common.observability.noop_tracer import NoOpTracer
+    from python.common.observability.sampling_tracer import SamplingTracer
+
+    # One tracer, since each one instruments Google GenAI; the sync variant is a
+    # copy of it without the background exporter
+    langfuse_async = LangfuseTracer(async_export=True)
+    langfuse_sync = copy.copy(langfuse_async)
+    langfuse_sync.exporter = None
+    return {
+        "noop": NoOpTracer(),
+        "langfuse": langfuse_sync,
+        "langfuse_async_export": langfuse_async,
+        "sampled_out": SamplingTracer(langfuse_async, default_ratio=0.0),
+    }
+
+
+def benchmark_mcp(iterations: int) -> Dict[str, Dict[str, float]]:
+    """
+    Per-call cost of the MCP context propagation helpers, inside an active span.
+    """
+    from langfuse import get_client
+
+    from python.mcp_tracing.src.utils.otel_utils import (
+        TracedMCPServer,
+        inject_otel_context_to_meta,
+        with_otel_context_from_meta,
+    )
+
+    class FakeServer:
+        async def call_tool(self, tool_name: str, arguments: dict) -> Any:
+            return arguments
+
+    def tool(query: str, _meta: dict = None) -> str:
+        return query
+
+    decorated = with_otel_context_from_meta(tool)
+    server = FakeServer()
+    traced_server = TracedMCPServer(server)
+    results = {}
+
+    with get_client().start_as_current_span(name="benchmark.client"):
+        meta = inject_otel_context_to_meta()
+        results["tool (undecorated)"] = measure_latency(
+            lambda: tool("q", _meta=meta), iterations
+        )
+        results["with_otel_context_from_meta"] = measure_latency(
+            lambda: decorated("q", _meta=meta), iterations
+        )
+        results["with_otel_context_from_meta (no _meta)"] = measure_latency(
+            lambda: decorated("q"), iterations
+        )
+
+        async def calls(target: Any) -> List[int]:
+            latencies = []
+            for _ in range(iterations):
+                start = time.perf_counter_ns()
+                await target.call_tool("search", {"query": "q"})
+                latencies.append(time.perf_counter_ns() - start)
+            return latencies
+
+        results["call_tool (direct)"] = summarize(asyncio.run(calls(server)))
+        results["TracedMCPServer.call_tool"] = summarize(
+            asyncio.run(calls(traced_server))
+        )
+    return results
+
+
+def print_table(title: str, rows: Dict[str, Dict[str, float]]) -> None:
+    print(f"\n{title}")
+    for name, values in rows.items():
+        print(
+            f"  {name:<48}"
+            + "  ".join(f"{key} {value:10.1f}" for key, value in values.items())
+        )
+
+
+def compare(
+    results: Dict[str, Dict[str, Dict[str, float]]],
+    baseline: Dict[str, Any],
+    tolerance: float,
+) -> List[str]:
+    """Returns the benchmarks whose p50 got slower than the baseline by more than `tolerance`."""
+    regressions = []
+    for section, rows in results.items():
+        for name, values in rows.items():
+            before = baseline.get(section, {}).get(name, {}).get("p50_us")
+            if before and values["p50_us"] > before * (1 + tolerance):
+                regressions.append(
+                    f"{section} / {name}: p50 {before:.1f} us -> {values['p50_us']:.1f} us"
+                )
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--iterations",
+        type=int,
+        default=2000,
+        help="Operations per latency measurement",
+    )
+    parser.add_argument(
+        "--requests", type=int, default=2000, help="Requests per concurrency level"
+    )
+    parser.add_argument("--save", help="Write the results to this JSON file")
+    parser.add_argument(
+        "--baseline", help="Fail if p50s regressed compared to this JSON file"
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.5,
+        help="Allowed p50 slowdown against the baseline, as a ratio",
+    )
+    args = parser.parse_args()
+
+    collector = FakeCollector()
+    os.environ.update(
+        LANGFUSE_HOST=collector.url,
+        LANGFUSE_PUBLIC_KEY="pk-lf-benchmark",
+        LANGFUSE_SECRET_KEY="sk-lf-benchmark",
+    )
+    dropped = DroppedBatches()
+    logging.getLogger(
+        "opentelemetry.exporter.otlp.proto.http.trace_exporter"
+    ).addHandler(dropped)
+    tracers = build_tracers()
+    results: Dict[str, Dict[str, Dict[str, float]]] = {"span": {}, "concurrency": {}}
+
+    for size in PAYLOAD_SIZES:
+        payload = "x" * size
+        for name, tracer in tracers.items():
+            operation = lambda: traced_operation(tracer, payload)
+            results["span"][f"{name} payload={size}"] = {
+                **measure_latency(operation, args.iterations),
+                **measure_memory(operation, max(10, args.iterations // 20)),
+            }
+    print_table("Per operation (trace + child span)", results["span"])
+
+    payload = "x" * 1024
+    for concurrency in CONCURRENCY_LEVELS:
+        for name, tracer in tracers.items():
+            results["concurrency"][f"{name} concurrency={concurrency}"] = asyncio.run(
+                measure_concurrency(tracer, payload, concurrency, args.requests)
+            )
+    print_table("Per request, 1 KiB payloads", results["concurrency"])
+
+    results["mcp"] = benchmark_mcp(args.iterations)
+    print_table("MCP context propagation, per call", results["mcp"])
+
+    # The Langfuse variants share one client and exporter
+    tracers["noop"].shutdown()
+    tracers["langfuse_async_export"].shutdown()
+    print(
+        f"\nFake collector received {collector.requests} requests, {collector.bytes / 1024 / 1024:.1f} MiB"
+    )
+    if dropped.count:
+        print(
+            f"The OTLP exporter dropped {dropped.count} span batches exceeding its maximum request size"
+        )
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("\nRegressions:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+        print("\nNo regressions against the baseline.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,9 @@
+import asyncio
 from abc import ABC, abstractmethod
 from typing import Any, Generator
 
+from .span_exporter import SpanRecord
+
 
 class TracerInterface(ABC):
     """
@@ -20,12 +23,14 @@ class TracerInterface(ABC):
         pass
 
     @abstractmethod
-    def span(self, name: str, **kwargs) -> Generator[Any, None, None]:
+    def span(self, name: str, parent: Any = None, **kwargs) -> Generator[Any, None, None]:
         """
         Abstract context manager to create a span.
 
         Args:
             name: The name of the span.
+            parent: The trace or span (as yielded by `trace` or `span`) to nest
+                the span under.
             **kwargs: Additional arguments for the tracing implementation.
         """
         pass
@@ -40,6 +45,48 @@ class TracerInterface(ABC):
         """
         pass
 
+    async def aget_prompt(self, name: str) -> Any:
+        """
+        Async version of `get_prompt`. Implementations whose `get_prompt` may
+        block should override it to wait without blocking the event loop.
+
+        Args:
+            name: The name of the prompt to retrieve.
+        """
+        return await asyncio.to_thread(self.get_prompt, name)
+
+    def replay(self, record: SpanRecord) -> None:
+        """
+        Traces a tree of spans that already ended, e.g. an unsampled trace that
+        failed. Implementations that can backdate spans should override it to
+        keep the recorded timings; by default the spans are traced anew.
+
+        Args:
+            record: The root span of the tree.
+        """
+        with self.trace(record.name, **record.kwargs) as trace:
+            self._replay_into(trace, record)
+
+    def _replay_into(self, span: Any, record: SpanRecord) -> None:
+        if span is not None and hasattr(span, "update"):
+            for update in record.updates:
+                span.update(**update)
+        for child in record.children:
+            with self.span(child.name, parent=span, **child.kwargs) as child_span:
+                self._replay_into(child_span, child)
+
+    def record_metric(self, name: str, value: float = 1, **attributes) -> None:
+        """
+        Records a metric data point, e.g. a cache hit counter increment.
+        Implementations without metrics support ignore it.
+
+        Args:
+            name: The name of the metric.
+            value: The amount to add.
+            **attributes: Attributes (labels) of the data point.
+        """
+        pass
+
     @abstractmethod
     def shutdown(self) -> None:
         """
@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import Dict, List, Optional
 from pydantic import Field, model_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -9,6 +9,18 @@ class AppConfig(BaseSettings):
     
     # Google GenAI Settings
     GOOGLE_API_KEY: str = Field(..., description="API Key for Google GenAI")
+    GEMINI_BASE_URL: Optional[str] = Field(None, description="Overrides the Gemini API endpoint, e.g. for load tests")
+    GEMINI_MAX_CONCURRENCY: int = Field(100, description="Maximum number of concurrent upstream generations per worker")
+
+    # Response Cache Settings
+    RESPONSE_CACHE_BACKEND: str = Field("none", description="Response cache backend: none (disabled), memory, sqlite or redis")
+    RESPONSE_CACHE_TTL: float = Field(3600.0, description="Seconds a cached response stays valid")
+    RESPONSE_CACHE_MAX_ENTRIES: int = Field(1024, description="Maximum number of responses cached in process")
+    RESPONSE_CACHE_MAX_BYTES: int = Field(64 * 1024 * 1024, description="Maximum total size of the responses cached in process")
+    RESPONSE_CACHE_URL: Optional[str] = Field(None, description="SQLite file or Redis URL of the shared response cache")
+    GEMINI_COALESCE: bool = Field(True, description="Share one upstream call between concurrent identical generations")
+    GEMINI_COALESCE_TIMEOUT: Optional[float] = Field(None, description="Seconds a coalesced generation waits for the shared call before making its own")
+    GEMINI_BATCH_CONCURRENCY: int = Field(16, description="Maximum number of concurrent generations per batch request")
     
     # App Settings
     ROOT_PATH: str = Field("", description="Root path for the API", validation_alias="ROOT_PATH")
@@ -18,6 +30,15 @@ class AppConfig(BaseSettings):
     LANGFUSE_PUBLIC_KEY: Optional[str] = Field(None, description="Langfuse Public Key")
     LANGFUSE_SECRET_KEY: Optional[str] = Field(None, description="Langfuse Secret Key")
     LANGFUSE_HOST: str = Field("https://cloud.langfuse.com", description="Langfuse Host URL")
+    PROMPT_CACHE_TTL: float = Field(60.0, description="Seconds a managed prompt is served locally before a background refresh")
+    PRELOAD_PROMPTS: List[str] = Field(["joke/joke-generator"], description="Managed prompts fetched at startup")
+    TRACE_ASYNC_EXPORT: bool = Field(True, description="Export spans from a background thread instead of the request path")
+    TRACE_EXPORT_QUEUE_SIZE: int = Field(10000, description="Maximum number of traces waiting for background export")
+    TRACE_EXPORT_POLICY: str = Field("drop_newest", description="When the export queue is full: drop_newest, drop_oldest or block")
+    TRACE_MAX_PAYLOAD_SIZE: Optional[int] = Field(64 * 1024, description="Span inputs and outputs longer than this many characters are truncated on export")
+    TRACE_SAMPLE_RATIOS: Dict[str, float] = Field({"GET /health": 0.0}, description="Ratio of traces sampled by trace name, e.g. '{\"GET /health\": 0.01}'")
+    TRACE_SAMPLE_DEFAULT_RATIO: float = Field(1.0, description="Ratio of traces sampled for names not in TRACE_SAMPLE_RATIOS")
+    TRACE_MAX_PER_SECOND: Optional[float] = Field(None, description="Maximum number of sampled traces per second, per worker")
 
     model_config = SettingsConfigDict(env_file='.env', env_file_encoding='utf-8', extra='ignore')
 
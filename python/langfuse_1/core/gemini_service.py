@@ -1,3 +1,8 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, List, Optional, Sequence, Union
+
 from google import genai
 from google.genai import types
 
@@ -5,52 +10,344 @@ from google.genai import types
 # In Bazel, this would be an absolute import like `langfuse_1.common.observability.tracer_interface`
 # Adjusting to relative for file location context.
 try:
+    from python.common.cache.response_cache import ResponseCache, cache_key
+    from python.common.cache.single_flight import SingleFlight
+    from python.common.observability.metrics import (
+        TIME_TO_FIRST_TOKEN,
+        UPSTREAM_DURATION,
+    )
     from python.common.observability.tracer_interface import TracerInterface
 except ImportError:
     # Fallback/Mock for when running standalone without full pythonpath
+    from ...common.cache.response_cache import ResponseCache, cache_key
+    from ...common.cache.single_flight import SingleFlight
+    from ...common.observability.metrics import TIME_TO_FIRST_TOKEN, UPSTREAM_DURATION
     from ...common.observability.tracer_interface import TracerInterface
 
+
 class GeminiService:
     """
     Business logic for interacting with Google GenAI.
     Decoupled from specific observability implementation.
     """
 
-    def __init__(self, api_key: str, tracer: TracerInterface):
-        self.client = genai.Client(api_key=api_key)
+    def __init__(
+        self,
+        api_key: str,
+        tracer: TracerInterface,
+        base_url: Optional[str] = None,
+        max_concurrency: int = 100,
+        timeout: float = 120.0,
+        cache: Optional[ResponseCache] = None,
+        coalesce: bool = True,
+        coalesce_timeout: Optional[float] = None,
+        coalesce_key: Callable[
+            [str, str, Optional[types.GenerateContentConfig]], str
+        ] = cache_key,
+    ):
+        """
+        Args:
+            api_key: Google GenAI API key.
+            tracer: Tracer used to trace each generation.
+            base_url: Overrides the Gemini API endpoint (e.g. a local fake server).
+            max_concurrency: Maximum number of async generations in flight at once.
+            timeout: Timeout of each call, in seconds.
+            cache: Cache of generated responses, keyed by model, prompt and
+                generation config; responses are always generated if None.
+            coalesce: Whether concurrent identical async generations share one
+                upstream call.
+            coalesce_timeout: Seconds a coalesced generation waits for the
+                shared call before making its own; as long as the shared call
+                takes if None.
+            coalesce_key: Maps (model name, prompt, config) to the key of
+                generations that may share a call.
+        """
+        # The client keeps one connection pool (an aiohttp session) for all its
+        # async calls, so concurrent generations reuse keep-alive connections
+        # instead of holding a thread each
+        self.client = genai.Client(
+            api_key=api_key,
+            http_options=types.HttpOptions(
+                base_url=base_url, timeout=int(timeout * 1000)
+            ),
+        )
         self.tracer = tracer
+        self._upstream_slots = asyncio.Semaphore(max_concurrency)
+        # Async generations waiting for a slot, and holding one
+        self.upstream_waiting = 0
+        self.upstream_in_flight = 0
+        self._metric_children = {}
+        self.cache = cache
+        self.coalesce_key = coalesce_key
+        self.single_flight = (
+            SingleFlight(timeout=coalesce_timeout) if coalesce else None
+        )
 
-    def generate_content(self, prompt: str, model_name: str = "gemini-2.5-flash") -> str:
+    @staticmethod
+    def _record_output(trace, result_text: str) -> None:
+        # If using manual trace object (like Langfuse), we might want to attach output
+        # For Langfuse @observe, it captures return value automatically.
+        # For manual trace, we update it.
+        if trace and hasattr(trace, "update"):
+            trace.update(output=result_text)
+
+    def _upstream_metrics(self, model_name: str):
+        # Histogram children of each model, bound once: (generate duration,
+        # stream duration, time to first token)
+        children = self._metric_children.get(model_name)
+        if children is None:
+            children = self._metric_children.setdefault(
+                model_name,
+                (
+                    UPSTREAM_DURATION.labels(model_name, "generate"),
+                    UPSTREAM_DURATION.labels(model_name, "stream"),
+                    TIME_TO_FIRST_TOKEN.labels(model_name),
+                ),
+            )
+        return children
+
+    @asynccontextmanager
+    async def _upstream_slot(self):
+        """Holds one of the `max_concurrency` upstream slots, counting waiters."""
+        self.upstream_waiting += 1
+        try:
+            await self._upstream_slots.acquire()
+        finally:
+            self.upstream_waiting -= 1
+        self.upstream_in_flight += 1
+        try:
+            yield
+        finally:
+            self.upstream_in_flight -= 1
+            self._upstream_slots.release()
+
+    def _record_cache_lookup(self, trace, hit: bool) -> None:
+        # Count the lookup and mark the trace, so cached responses are told apart
+        self.tracer.record_metric(
+            "gemini.response_cache.hits" if hit else "gemini.response_cache.misses"
+        )
+        if trace and hasattr(trace, "update"):
+            trace.update(metadata={"cache_hit": hit})
+
+    def generate_content(
+        self,
+        prompt: str,
+        model_name: str = "gemini-2.5-flash",
+        config: Optional[types.GenerateContentConfig] = None,
+    ) -> str:
         """
         Generates content using Google GenAI with tracing.
         """
-        
+
         # Start a trace for this operation
         # We pass the input to the trace for observability context
-        with self.tracer.trace(name="GeminiService.generate_content", input=prompt) as trace:
+        with self.tracer.trace(
+            name="GeminiService.generate_content", input=prompt
+        ) as trace:
             try:
+                key = (
+                    cache_key(model_name, prompt, config)
+                    if self.cache is not None
+                    else None
+                )
+                if key:
+                    cached = self.cache.get(key)
+                    self._record_cache_lookup(trace, hit=cached is not None)
+                    if cached is not None:
+                        self._record_output(trace, cached)
+                        return cached
+
                 # The actual call to Google GenAI
                 # OpenInference should automatically pick this up if instrumented
+                start = time.perf_counter()
                 response = self.client.models.generate_content(
-                    model=model_name,
-                    contents=prompt
+                    model=model_name, contents=prompt, config=config
+                )
+                self._upstream_metrics(model_name)[0].observe(
+                    time.perf_counter() - start
                 )
-                
+
                 result_text = response.text
-                
-                # If using manual trace object (like Langfuse), we might want to attach output
-                if trace:
-                    # Depending on the interface contract, we might want to set output
-                    # For Langfuse @observe, it captures return value automatically.
-                    # For manual trace, we update it.
-                     if hasattr(trace, "update"):
-                        trace.update(output=result_text)
-                
+                if key and result_text:
+                    self.cache.set(key, result_text)
+                self._record_output(trace, result_text)
                 return result_text
             except Exception as e:
                 # The tracer exit logic should handle the exception status update
                 raise e
 
+    async def agenerate_content(
+        self,
+        prompt: str,
+        model_name: str = "gemini-2.5-flash",
+        config: Optional[types.GenerateContentConfig] = None,
+        parent: Any = None,
+    ) -> str:
+        """
+        Async version of `generate_content`, over the SDK's async client.
+
+        Does not block the event loop, so one worker can serve many concurrent
+        generations. Traced as a span of `parent` if given, else as its own trace.
+        """
+        if parent is not None:
+            observation = self.tracer.span(
+                name="GeminiService.generate_content", parent=parent, input=prompt
+            )
+        else:
+            observation = self.tracer.trace(
+                name="GeminiService.generate_content", input=prompt
+            )
+        with observation as trace:
+            key = (
+                cache_key(model_name, prompt, config)
+                if self.cache is not None
+                else None
+            )
+            if key:
+                cached = await self.cache.aget(key)
+                self._record_cache_lookup(trace, hit=cached is not None)
+                if cached is not None:
+                    self._record_output(trace, cached)
+                    return cached
+
+            async def generate() -> str:
+                async with self._upstream_slot():
+                    start = time.perf_counter()
+                    response = await self.client.aio.models.generate_content(
+                        model=model_name, contents=prompt, config=config
+                    )
+                    self._upstream_metrics(model_name)[0].observe(
+                        time.perf_counter() - start
+                    )
+                if key and response.text:
+                    await self.cache.aset(key, response.text)
+                return response.text
+
+            if self.single_flight is None:
+                result_text = await generate()
+            else:
+                # Identical generations already in flight share their result
+                # instead of calling Gemini again
+                result_text, coalesced = await self.single_flight.do(
+                    self.coalesce_key(model_name, prompt, config), generate
+                )
+                if coalesced:
+                    self.tracer.record_metric("gemini.single_flight.collapsed")
+                    if trace and hasattr(trace, "update"):
+                        trace.update(metadata={"coalesced": True})
+            self._record_output(trace, result_text)
+            return result_text
+
+    async def generate_many(
+        self,
+        prompts: Sequence[str],
+        model_name: str = "gemini-2.5-flash",
+        config: Optional[types.GenerateContentConfig] = None,
+        max_concurrency: int = 16,
+    ) -> List[Union[str, Exception]]:
+        """
+        Generates content for many prompts, at most `max_concurrency` at a time.
+
+        Identical prompts are generated once. Returns one result per prompt, in
+        input order: the generated text, or the exception its generation raised,
+        so one failure does not fail the batch. Each generation is traced as a
+        span of one batch trace.
+        """
+        unique = list(dict.fromkeys(prompts))
+        slots = asyncio.Semaphore(max_concurrency)
+
+        with self.tracer.trace(
+            name="GeminiService.generate_many",
+            input={"prompts": len(prompts), "unique_prompts": len(unique)},
+        ) as batch:
+
+            async def generate(prompt: str) -> str:
+                async with slots:
+                    return await self.agenerate_content(
+                        prompt, model_name, config, parent=batch
+                    )
+
+            results = await asyncio.gather(
+                *(generate(prompt) for prompt in unique), return_exceptions=True
+            )
+            by_prompt = dict(zip(unique, results))
+            errors = sum(isinstance(result, Exception) for result in results)
+            if batch and hasattr(batch, "update"):
+                batch.update(
+                    output={"generated": len(unique) - errors, "errors": errors},
+                    level="WARNING" if errors else None,
+                )
+            return [by_prompt[prompt] for prompt in prompts]
+
+    async def astream_content(
+        self,
+        prompt: str,
+        model_name: str = "gemini-2.5-flash",
+        config: Optional[types.GenerateContentConfig] = None,
+    ) -> AsyncIterator[str]:
+        """
+        Streams generated text, yielding each chunk as soon as Gemini sends it.
+
+        A cached response is yielded as a single chunk; a streamed one is cached
+        once it completed. The trace records the assembled output and the time to
+        first token, also when the consumer stops early (e.g. the client
+        disconnected).
+        """
+        with self.tracer.trace(
+            name="GeminiService.stream_content", input=prompt
+        ) as trace:
+            start = time.perf_counter()
+            time_to_first_token = None
+            chunks = []
+            key = (
+                cache_key(model_name, prompt, config)
+                if self.cache is not None
+                else None
+            )
+            cached = await self.cache.aget(key) if key else None
+            if key:
+                self.tracer.record_metric(
+                    "gemini.response_cache.hits"
+                    if cached is not None
+                    else "gemini.response_cache.misses"
+                )
+            try:
+                if cached is not None:
+                    time_to_first_token = time.perf_counter() - start
+                    chunks.append(cached)
+                    yield cached
+                    return
+
+                _, stream_duration, first_token = self._upstream_metrics(model_name)
+                async with self._upstream_slot():
+                    upstream_start = time.perf_counter()
+                    stream = await self.client.aio.models.generate_content_stream(
+                        model=model_name, contents=prompt, config=config
+                    )
+                    async for chunk in stream:
+                        if not chunk.text:
+                            continue
+                        if time_to_first_token is None:
+                            time_to_first_token = time.perf_counter() - start
+                            first_token.observe(time_to_first_token)
+                        chunks.append(chunk.text)
+                        yield chunk.text
+                    stream_duration.observe(time.perf_counter() - upstream_start)
+                if key and chunks:
+                    await self.cache.aset(key, "".join(chunks))
+            finally:
+                if trace and hasattr(trace, "update"):
+                    metadata = {
+                        "time_to_first_token_ms": (
+                            None
+                            if time_to_first_token is None
+                            else round(1000 * time_to_first_token, 1)
+                        ),
+                    }
+                    if key:
+                        metadata["cache_hit"] = cached is not None
+                    trace.update(output="".join(chunks), metadata=metadata)
+
     def generate_joke(self, topic: str) -> str:
         """
         Generates a joke about the given topic using a managed prompt.
@@ -60,7 +357,7 @@ class GeminiService:
             prompt_obj = self.tracer.get_prompt("joke/joke-generator")
             # Compile prompt with the variable 'topic'
             compiled_prompt = prompt_obj.compile(topic=topic)
-            
+
             # Use the compiled prompt for generation
             return self.generate_content(compiled_prompt)
         except Exception as e:
@@ -68,3 +365,39 @@ class GeminiService:
             print(f"Error fetching managed prompt: {e}")
             fallback_prompt = f"Tell me a joke about {topic}"
             return self.generate_content(fallback_prompt)
+
+    async def agenerate_joke(self, topic: str) -> str:
+        """
+        Async version of `generate_joke`.
+        """
+        try:
+            # A fetch of the prompt, if needed, does not block the event loop
+            prompt_obj = await self.tracer.aget_prompt("joke/joke-generator")
+            compiled_prompt = prompt_obj.compile(topic=topic)
+            return await self.agenerate_content(compiled_prompt)
+        except Exception as e:
+            print(f"Error fetching managed prompt: {e}")
+            fallback_prompt = f"Tell me a joke about {topic}"
+            return await self.agenerate_content(fallback_prompt)
+
+    async def astream_joke(self, topic: str) -> AsyncIterator[str]:
+        """
+        Streaming version of `generate_joke`.
+
+        Falls back to a plain prompt only if the managed prompt cannot be
+        fetched or compiled; a stream that already started cannot be retried.
+        """
+        try:
+            prompt_obj = await self.tracer.aget_prompt("joke/joke-generator")
+            compiled_prompt = prompt_obj.compile(topic=topic)
+        except Exception as e:
+            print(f"Error fetching managed prompt: {e}")
+            compiled_prompt = f"Tell me a joke about {topic}"
+        async for chunk in self.astream_content(compiled_prompt):
+            yield chunk
+
+    async def aclose(self) -> None:
+        """
+        Closes the pooled connections of the async client.
+        """
+        await self.client.aio.aclose()
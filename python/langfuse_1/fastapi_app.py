@@ -1,6 +1,10 @@
 import uvicorn
+import json
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional
 from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
 import sys
 import os
 
@@ -10,23 +14,131 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(
 
 from python.langfuse_1.config import AppConfig
 from python.langfuse_1.core.gemini_service import GeminiService
+from python.common.cache.response_cache import build_response_cache
 from python.common.m_fastAPI.fastapi_base import create_base_app
+from python.common.observability.metrics import CallbackCollector
+from prometheus_client import REGISTRY
 
 app_config = AppConfig()
 
 # Initialize Tracer
 if app_config.ENABLE_OBSERVABILITY:
     from python.common.observability.langfuse_tracer import LangfuseTracer
-    tracer = LangfuseTracer()
+    from python.common.observability.sampling_tracer import SamplingTracer
+    langfuse_tracer = LangfuseTracer(
+        prompt_cache_ttl=app_config.PROMPT_CACHE_TTL,
+        preload_prompts=app_config.PRELOAD_PROMPTS,
+        async_export=app_config.TRACE_ASYNC_EXPORT,
+        export_queue_size=app_config.TRACE_EXPORT_QUEUE_SIZE,
+        export_policy=app_config.TRACE_EXPORT_POLICY,
+        max_payload_size=app_config.TRACE_MAX_PAYLOAD_SIZE,
+    )
+    # Failed requests are always traced; others only as sampled
+    tracer = SamplingTracer(
+        langfuse_tracer,
+        ratios=app_config.TRACE_SAMPLE_RATIOS,
+        default_ratio=app_config.TRACE_SAMPLE_DEFAULT_RATIO,
+        max_traces_per_second=app_config.TRACE_MAX_PER_SECOND,
+    )
 else:
     from python.common.observability.noop_tracer import NoOpTracer
     tracer = NoOpTracer()
 
 # Initialize Service
-gemini_service = GeminiService(api_key=app_config.GOOGLE_API_KEY, tracer=tracer)
+gemini_service = GeminiService(
+    api_key=app_config.GOOGLE_API_KEY,
+    tracer=tracer,
+    base_url=app_config.GEMINI_BASE_URL,
+    max_concurrency=app_config.GEMINI_MAX_CONCURRENCY,
+    cache=build_response_cache(
+        backend=app_config.RESPONSE_CACHE_BACKEND,
+        ttl=app_config.RESPONSE_CACHE_TTL,
+        max_entries=app_config.RESPONSE_CACHE_MAX_ENTRIES,
+        max_bytes=app_config.RESPONSE_CACHE_MAX_BYTES,
+        url=app_config.RESPONSE_CACHE_URL,
+        namespace="gemini_responses",
+    ),
+    coalesce=app_config.GEMINI_COALESCE,
+    coalesce_timeout=app_config.GEMINI_COALESCE_TIMEOUT,
+)
+
+def service_metrics() -> CallbackCollector:
+    """
+    Cache, coalescing and queue metrics, read from the counters the service and
+    tracer keep when `/metrics` is scraped.
+    """
+    cache, single_flight = gemini_service.cache, gemini_service.single_flight
+    exporter = getattr(tracer, "exporter", None)
+    gauges = {
+        "gemini_upstream_queue_depth": lambda: {None: gemini_service.upstream_waiting},
+        "gemini_upstream_in_flight": lambda: {None: gemini_service.upstream_in_flight},
+    }
+    counters = {}
+    if cache is not None:
+        counters["gemini_response_cache_lookups"] = lambda: {"hit": cache.stats.hits, "miss": cache.stats.misses}
+    if single_flight is not None:
+        counters["gemini_single_flight_calls"] = lambda: {
+            "leader": single_flight.stats.leaders,
+            "collapsed": single_flight.stats.collapsed,
+            "timeout": single_flight.stats.timeouts,
+        }
+    if exporter is not None:
+        gauges["trace_export_queue_depth"] = lambda: {None: exporter.queue_depth}
+        counters["trace_export_spans"] = lambda: {
+            "exported": exporter.stats.exported,
+            "dropped": exporter.stats.dropped,
+            "failed": exporter.stats.failed,
+        }
+    return CallbackCollector(gauges=gauges, counters=counters)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Registered for the app's lifetime rather than at import, so importing the
+    # module again does not register the same metrics twice
+    collector = service_metrics()
+    REGISTRY.register(collector)
+    yield
+    REGISTRY.unregister(collector)
+    # Release the pooled upstream connections
+    await gemini_service.aclose()
+    # Export the spans still queued and flush them to Langfuse
+    tracer.shutdown()
 
 # Create Base App
-app = create_base_app(root_path=app_config.ROOT_PATH)
+app = create_base_app(root_path=app_config.ROOT_PATH, lifespan=lifespan)
+
+def sse_response(name: str, request_input: dict, chunks: AsyncIterator[str], output_key: str) -> StreamingResponse:
+    """
+    Streams generated text as Server-Sent Events.
+
+    Each chunk is sent as a `data: {"text": ...}` event as soon as it arrives,
+    followed by a `done` event, or an `error` event if generation fails midway
+    (the status code has already been sent by then). The request is traced like
+    the non-streaming endpoints, with the assembled output.
+    """
+    async def events():
+        with tracer.trace(name=name, input=request_input) as span:
+            parts = []
+            try:
+                async for chunk in chunks:
+                    parts.append(chunk)
+                    yield f"data: {json.dumps({'text': chunk})}\n\n"
+            except Exception as e:
+                if span and hasattr(span, "update"):
+                    span.update(level="ERROR", status_message=str(e))
+                yield f"event: error\ndata: {json.dumps({'detail': str(e)})}\n\n"
+            else:
+                yield "event: done\ndata: {}\n\n"
+            finally:
+                if span and hasattr(span, "update"):
+                    span.update(output={output_key: "".join(parts)})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # Keep proxies from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 class RecipeRequest(BaseModel):
     prompt: str
@@ -40,7 +152,11 @@ def health_check():
         return msg
 
 @app.post("/gen-recipe")
-def generate_recipe(request: RecipeRequest):
+async def generate_recipe(request: RecipeRequest, stream: bool = False):
+    if stream:
+        return sse_response(
+            "POST /gen-recipe", request.model_dump(), gemini_service.astream_content(request.prompt), "recipe"
+        )
     try:
         # We manually trace this request if observability is enabled
         # Ideally, we would use middleware for full request tracing,
@@ -49,23 +165,48 @@ def generate_recipe(request: RecipeRequest):
         # But let's wrap the endpoint logic in a span as well for better visibility.
         
         with tracer.trace(name="POST /gen-recipe", input=request.model_dump()) as span:
-            result = gemini_service.generate_content(request.prompt)
+            # Async, so the worker keeps serving other requests while Gemini generates
+            result = await gemini_service.agenerate_content(request.prompt)
             if span and hasattr(span, "update"):
                 span.update(output=result)
             return {"recipe": result}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+class BatchRecipeRequest(BaseModel):
+    prompts: List[str] = Field(..., min_length=1, max_length=1000)
+
+class BatchRecipeResult(BaseModel):
+    recipe: Optional[str] = None
+    error: Optional[str] = None
+
+@app.post("/gen-recipe/batch")
+async def generate_recipe_batch(request: BatchRecipeRequest) -> Dict[str, List[BatchRecipeResult]]:
+    # Items fail individually, so the batch itself always succeeds
+    results = await gemini_service.generate_many(
+        request.prompts, max_concurrency=app_config.GEMINI_BATCH_CONCURRENCY
+    )
+    return {
+        "results": [
+            BatchRecipeResult(error=str(result)) if isinstance(result, Exception) else BatchRecipeResult(recipe=result)
+            for result in results
+        ]
+    }
+
 class JokeRequest(BaseModel):
     topic: str
 
 @app.post("/gen-joke")
-def generate_joke(request: JokeRequest):
+async def generate_joke(request: JokeRequest, stream: bool = False):
+    if stream:
+        return sse_response(
+            "POST /gen-joke", request.model_dump(), gemini_service.astream_joke(request.topic), "joke"
+        )
     try:
         # Trace the request
         with tracer.trace(name="POST /gen-joke", input=request.model_dump()) as span:
             # This calls the service which fetches the managed prompt
-            result = gemini_service.generate_joke(request.topic)
+            result = await gemini_service.agenerate_joke(request.topic)
             if span and hasattr(span, "update"):
                 span.update(output=result)
             return {"joke": result}
@@ -0,0 +1,171 @@
+"""
+Load test of the FastAPI app against a local fake Gemini server.
+
+The fake server answers `generateContent` after a fixed delay, standing in for
+model latency, and `streamGenerateContent` with one word at a time spread over
+the same delay. The same burst of `/gen-recipe` requests is sent to the app's
+async endpoint, to its streaming mode and to a sync (threadpool) endpoint
+calling the blocking `GeminiService.generate_content`, and throughput, latency
+and time to first byte are reported for each.
+
+Usage:
+    bazel run //python/langfuse_1:load_test -- --requests 2000 --concurrency 500
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import threading
+import time
+from typing import List
+
+import aiohttp
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+FAKE_TEXT = "Mix flour, water and salt. Bake for 40 minutes."
+
+
+def create_fake_gemini(latency: float) -> FastAPI:
+    """
+    A minimal stand-in for the Gemini API's generateContent and
+    streamGenerateContent endpoints.
+    """
+    fake = FastAPI()
+
+    def response(text: str) -> dict:
+        return {
+            "candidates": [
+                {
+                    "content": {"role": "model", "parts": [{"text": text}]},
+                    "finishReason": "STOP",
+                }
+            ],
+            "usageMetadata": {"promptTokenCount": 8, "candidatesTokenCount": 12, "totalTokenCount": 20},
+        }
+
+    @fake.post("/{api_version}/models/{model_action}")
+    async def generate_content(api_version: str, model_action: str, request: Request):
+        await request.body()
+        if model_action.endswith(":streamGenerateContent"):
+            words = FAKE_TEXT.split(" ")
+
+            async def events():
+                for i, word in enumerate(words):
+                    await asyncio.sleep(latency / len(words))
+                    yield f"data: {json.dumps(response(word if i == 0 else ' ' + word))}\r\n\r\n"
+
+            return StreamingResponse(events(), media_type="text/event-stream")
+        await asyncio.sleep(latency)
+        return response(FAKE_TEXT)
+
+    return fake
+
+
+def serve_in_background(app: FastAPI) -> str:
+    """
+    Serves an app with uvicorn on a free local port and returns its URL.
+    """
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}"
+
+
+def percentile(values: List[float], q: float) -> float:
+    values = sorted(values)
+    return values[int(q * (len(values) - 1))]
+
+
+async def run_load(url: str, requests: int, concurrency: int) -> dict:
+    """
+    Sends `requests` POSTs to `url`, `concurrency` at a time, and measures them.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    first_bytes: List[float] = []
+    errors = 0
+    connector = aiohttp.TCPConnector(limit=concurrency)
+
+    async with aiohttp.ClientSession(connector=connector) as client:
+
+        async def one(i: int) -> None:
+            nonlocal errors
+            async with semaphore:
+                start = time.perf_counter()
+                first_byte = None
+                body = b""
+                async with client.post(url, json={"prompt": f"Recipe #{i}"}) as response:
+                    async for chunk in response.content.iter_any():
+                        if first_byte is None:
+                            first_byte = time.perf_counter() - start
+                        body += chunk
+                latencies.append(time.perf_counter() - start)
+                first_bytes.append(first_byte)
+                if response.status != 200 or b"event: error" in body:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(requests)))
+        elapsed = time.perf_counter() - start
+
+    return {
+        "requests/s": requests / elapsed,
+        "p50 ms": 1000 * statistics.median(latencies),
+        "p99 ms": 1000 * percentile(latencies, 0.99),
+        "first byte p50 ms": 1000 * statistics.median(first_bytes),
+        "errors": errors,
+        "threads": threading.active_count(),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.5, help="Fake model latency, in seconds")
+    args = parser.parse_args()
+
+    fake_url = serve_in_background(create_fake_gemini(args.latency))
+
+    # Point the app at the fake server before it builds its service
+    os.environ["GOOGLE_API_KEY"] = "fake-key"
+    os.environ["GEMINI_BASE_URL"] = fake_url
+    os.environ["GEMINI_MAX_CONCURRENCY"] = str(args.concurrency)
+    os.environ["ENABLE_OBSERVABILITY"] = "false"
+    # Every request goes upstream, so the runs measure the model calls rather
+    # than answers cached or shared from an earlier run
+    os.environ["RESPONSE_CACHE_BACKEND"] = "none"
+    os.environ["GEMINI_COALESCE"] = "false"
+    from python.langfuse_1.fastapi_app import RecipeRequest, app, gemini_service
+
+    # The same endpoint as before it was made async: a sync handler, run in
+    # Starlette's threadpool, holding a thread for the whole upstream call
+    @app.post("/gen-recipe-sync")
+    def generate_recipe_sync(request: RecipeRequest):
+        return {"recipe": gemini_service.generate_content(request.prompt)}
+
+    app_url = serve_in_background(app)
+
+    print(
+        f"{args.requests} requests, {args.concurrency} concurrent, "
+        f"{1000 * args.latency:.0f} ms fake model latency"
+    )
+    for label, path in (
+        ("async  /gen-recipe", "/gen-recipe"),
+        ("stream /gen-recipe", "/gen-recipe?stream=true"),
+        ("sync   /gen-recipe", "/gen-recipe-sync"),
+    ):
+        result = asyncio.run(run_load(app_url + path, args.requests, args.concurrency))
+        print(f"{label}: " + ", ".join(f"{k} {v:.1f}" if isinstance(v, float) else f"{k} {v}" for k, v in result.items()))
+
+
+if __name__ == "__main__":
+    main()
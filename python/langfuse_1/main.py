@@ -16,7 +16,7 @@ def get_tracer(config: AppConfig) -> TracerInterface:
     if config.ENABLE_OBSERVABILITY:
         logger.info("Observability enabled. Initializing LangfuseTracer.")
         from python.common.observability.langfuse_tracer import LangfuseTracer
-        return LangfuseTracer()
+        return LangfuseTracer(prompt_cache_ttl=config.PROMPT_CACHE_TTL, preload_prompts=config.PRELOAD_PROMPTS)
     else:
         logger.info("Observability disabled. Initializing NoOpTracer.")
         from python.common.observability.noop_tracer import NoOpTracer
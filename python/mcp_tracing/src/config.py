@@ -22,6 +22,49 @@ class AppConfig(BaseSettings):
         "https://cloud.langfuse.com", description="Langfuse Host URL"
     )
     EXA_API_KEY: Optional[str] = Field(None, description="Exa API Key")
+    EXA_API_BASE: str = Field(
+        "https://api.exa.ai", description="Exa API endpoint, e.g. a local fake"
+    )
+    EXA_MAX_CONNECTIONS: int = Field(
+        32, description="Maximum number of pooled connections to Exa"
+    )
+    EXA_TIMEOUT: float = Field(30.0, description="Timeout of Exa requests, in seconds")
+    SEARCH_CACHE_BACKEND: str = Field(
+        "memory", description="Search result cache backend: none, memory or sqlite"
+    )
+    SEARCH_CACHE_TTL: float = Field(
+        3600.0, description="Seconds cached search results stay valid"
+    )
+    SEARCH_CACHE_MAX_ENTRIES: int = Field(
+        1024, description="Maximum number of searches cached in process"
+    )
+    SEARCH_CACHE_PATH: Optional[str] = Field(
+        None, description="SQLite file of the persistent search cache"
+    )
+    SEARCH_MANY_NUM_RESULTS: int = Field(
+        3, description="Default number of results per query of search_many"
+    )
+    SEARCH_MANY_MAX_NUM_RESULTS: int = Field(
+        10, description="Maximum number of results per query of search_many"
+    )
+    SEARCH_MANY_CONCURRENCY: int = Field(
+        8, description="Maximum number of concurrent searches per search_many call"
+    )
+    SEARCH_MANY_MAX_QUERIES: int = Field(
+        20, description="Maximum number of queries per search_many call"
+    )
+    LANGFUSE_FLUSH_INTERVAL: float = Field(
+        1.0, description="Seconds between background exports of spans to Langfuse"
+    )
+    MCP_POOL_SIZE: int = Field(
+        2, description="Number of warm search server workers calls are spread across"
+    )
+    MCP_POOL_TRANSPORT: str = Field(
+        "stdio", description="Transport to the search server workers: stdio or http"
+    )
+    MCP_HEALTH_CHECK_INTERVAL: float = Field(
+        30.0, description="Seconds between health checks of each search server worker"
+    )
     LLM_API_PROVIDER: Optional[str] = Field(
         "google_genai", description="LLM API Provider"
     )
@@ -1,7 +1,7 @@
 import asyncio
 import os
 
-from agents import Agent, Runner, set_tracing_disabled
+from agents import Agent, ModelSettings, Runner, set_tracing_disabled
 from agents.extensions.models.litellm_model import LitellmModel
 from agents.mcp import MCPServer, MCPServerStdio
 from langfuse import get_client, observe
@@ -11,6 +11,10 @@ from openinference.instrumentation.google_genai import GoogleGenAIInstrumentor
 
 from python.mcp_tracing.src.config import AppConfig
 from python.mcp_tracing.src.utils.otel_utils import TracedMCPServer
+from python.mcp_tracing.src.utils.server_pool import (
+    LocalMCPServerStreamableHttp,
+    MCPServerPool,
+)
 
 config = AppConfig()
 langfuse = get_client()
@@ -30,6 +34,8 @@ async def run(mcp_server: MCPServer):
         ),
         instructions="Use the tools to answer the users question.",
         mcp_servers=[traced_server],
+        # Independent tool calls of one turn run concurrently on the server
+        model_settings=ModelSettings(parallel_tool_calls=True),
     )
 
     while True:
@@ -48,15 +54,35 @@ async def run(mcp_server: MCPServer):
         langfuse.flush()
 
 
-async def main():
-    async with MCPServerStdio(
-        name="Search server",
+SEARCH_SERVER_COMMAND = "python/mcp_tracing/src/search_server"
+
+
+def search_server_worker(index: int) -> MCPServer:
+    if config.MCP_POOL_TRANSPORT == "http":
+        return LocalMCPServerStreamableHttp(
+            command=[SEARCH_SERVER_COMMAND],
+            name=f"Search server {index}",
+            env=dict(os.environ),
+            client_session_timeout_seconds=30,
+        )
+    return MCPServerStdio(
+        name=f"Search server {index}",
         params={
-            "command": "python/mcp_tracing/src/search_server",
+            "command": SEARCH_SERVER_COMMAND,
             "args": [],
             "env": dict(os.environ),
         },
         client_session_timeout_seconds=30,
+    )
+
+
+async def main():
+    # Workers stay warm across agent runs and are restarted if they fail
+    async with MCPServerPool(
+        search_server_worker,
+        size=config.MCP_POOL_SIZE,
+        name="Search server",
+        health_check_interval=config.MCP_HEALTH_CHECK_INTERVAL,
     ) as server:
         await run(server)
 
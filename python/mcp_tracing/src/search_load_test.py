@@ -0,0 +1,161 @@
+"""
+Load test of the MCP search tool against local fake Exa and Langfuse servers.
+
+The fake Exa server answers searches after a fixed delay, and the fake
+Langfuse server accepts span exports after another one. Concurrent `search`
+tool calls are made through an in-memory MCP client, and their latency is
+reported against the fake search latency: with spans exported in the
+background, a tool call should take about as long as the search itself,
+whatever the export latency.
+
+Usage:
+    bazel run //python/mcp_tracing/src:search_load_test -- --calls 200 --concurrency 20
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import socket
+import statistics
+import time
+from typing import Callable, List
+
+import uvicorn
+from fastapi import FastAPI, Request
+
+
+def create_fake_exa(latency: float) -> FastAPI:
+    """A minimal stand-in for Exa's /search endpoint."""
+    fake = FastAPI()
+
+    @fake.post("/search")
+    async def search(request: Request):
+        body = await request.json()
+        await asyncio.sleep(latency)
+        return {
+            "requestId": "fake",
+            "resolvedSearchType": "neural",
+            "results": [
+                {
+                    "id": f"https://example.com/{i}",
+                    "url": f"https://example.com/{i}",
+                    "title": f"Result {i} for {body['query']}",
+                    "highlights": ["A highlight."],
+                    "highlightScores": [0.5],
+                }
+                for i in range(body.get("numResults", 1))
+            ],
+        }
+
+    return fake
+
+
+def create_fake_langfuse(latency: float) -> FastAPI:
+    """Accepts any Langfuse API or OTLP export call after a delay."""
+    fake = FastAPI()
+
+    @fake.api_route("/{path:path}", methods=["GET", "POST"])
+    async def accept(path: str, request: Request):
+        await request.body()
+        await asyncio.sleep(latency)
+        return {}
+
+    return fake
+
+
+def _serve(create_app: Callable[[float], FastAPI], latency: float, port: int) -> None:
+    uvicorn.run(create_app(latency), host="127.0.0.1", port=port, log_level="warning")
+
+
+def serve_in_subprocess(create_app: Callable[[float], FastAPI], latency: float) -> str:
+    """
+    Serves a fake in its own process, so it does not compete with the MCP
+    server for the GIL, and returns its URL once it accepts connections.
+    """
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    multiprocessing.Process(
+        target=_serve, args=(create_app, latency, port), daemon=True
+    ).start()
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", port)).close()
+            return f"http://127.0.0.1:{port}"
+        except ConnectionRefusedError:
+            time.sleep(0.05)
+
+
+def percentile(values: List[float], q: float) -> float:
+    values = sorted(values)
+    return values[int(q * (len(values) - 1))]
+
+
+async def run_load(mcp, calls: int, concurrency: int) -> dict:
+    from fastmcp import Client
+
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+
+    async with Client(mcp) as client:
+
+        async def one(i: int) -> None:
+            async with semaphore:
+                start = time.perf_counter()
+                await client.call_tool("search", {"query": f"query {i}"})
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(calls)))
+        elapsed = time.perf_counter() - start
+
+    return {
+        "calls/s": calls / elapsed,
+        "p50 ms": 1000 * statistics.median(latencies),
+        "p99 ms": 1000 * percentile(latencies, 0.99),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument(
+        "--search-latency", type=float, default=0.2, help="Fake Exa latency, in seconds"
+    )
+    parser.add_argument(
+        "--export-latency",
+        type=float,
+        default=0.5,
+        help="Fake Langfuse latency, in seconds",
+    )
+    args = parser.parse_args()
+
+    exa_url = serve_in_subprocess(create_fake_exa, args.search_latency)
+    langfuse_url = serve_in_subprocess(create_fake_langfuse, args.export_latency)
+
+    # Point the server at the fakes before it builds its clients
+    os.environ.update(
+        GOOGLE_API_KEY="fake-key",
+        EXA_API_KEY="fake-key",
+        EXA_API_BASE=exa_url,
+        LANGFUSE_HOST=langfuse_url,
+        LANGFUSE_PUBLIC_KEY="pk-lf-fake",
+        LANGFUSE_SECRET_KEY="sk-lf-fake",
+    )
+    from python.mcp_tracing.src.search_server import mcp
+
+    result = asyncio.run(run_load(mcp, args.calls, args.concurrency))
+    print(
+        f"{args.calls} search calls, {args.concurrency} concurrent, "
+        f"{1000 * args.search_latency:.0f} ms fake search latency, "
+        f"{1000 * args.export_latency:.0f} ms fake export latency"
+    )
+    print(", ".join(f"{k} {v:.1f}" for k, v in result.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,45 +1,229 @@
-from exa_py import Exa
+import argparse
+import asyncio
+import hashlib
+import json
+import unicodedata
+from contextlib import asynccontextmanager
+from typing import List, Optional, Tuple
+
+import httpx
+from exa_py import AsyncExa
 from fastmcp import FastMCP
 from langfuse import Langfuse, observe
 
+from python.common.cache.response_cache import build_response_cache
+from python.common.cache.single_flight import SingleFlight
 from python.mcp_tracing.src.config import AppConfig
 from python.mcp_tracing.src.utils.otel_utils import with_otel_context_from_meta
 
 config = AppConfig()
-langfuse = Langfuse()
+# Spans are exported by Langfuse's background processor every
+# `flush_interval` seconds, never on a tool's return path
+langfuse = Langfuse(flush_interval=config.LANGFUSE_FLUSH_INTERVAL)
+
+
+class PooledAsyncExa(AsyncExa):
+    """
+    Async Exa client over one pooled HTTP client, so concurrent searches reuse
+    keep-alive connections.
+    """
+
+    def __init__(
+        self, api_key: str, api_base: str, max_connections: int, timeout: float
+    ) -> None:
+        super().__init__(api_key=api_key, api_base=api_base)
+        self._pooled_client = httpx.AsyncClient(
+            base_url=self.base_url,
+            headers=self.headers,
+            timeout=timeout,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+            ),
+        )
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        return self._pooled_client
+
+
+exa = PooledAsyncExa(
+    api_key=config.EXA_API_KEY,
+    api_base=config.EXA_API_BASE,
+    max_connections=config.EXA_MAX_CONNECTIONS,
+    timeout=config.EXA_TIMEOUT,
+)
+
+# Exa results by search, shared by concurrent identical searches while in flight
+search_cache = build_response_cache(
+    backend=config.SEARCH_CACHE_BACKEND,
+    ttl=config.SEARCH_CACHE_TTL,
+    max_entries=config.SEARCH_CACHE_MAX_ENTRIES,
+    url=config.SEARCH_CACHE_PATH,
+    namespace="exa_searches",
+)
+search_flight = SingleFlight()
+
+
+def search_key(query: str, **params) -> str:
+    """
+    Cache key of a search: the query and the search parameters.
+
+    The query is Unicode-normalized, case-folded and whitespace-collapsed, so
+    queries differing only in case or spacing share results.
+    """
+    normalized = " ".join(unicodedata.normalize("NFKC", query).casefold().split())
+    payload = {"query": normalized, **params}
+    return hashlib.sha256(
+        json.dumps(payload, sort_keys=True).encode("utf-8")
+    ).hexdigest()
+
 
-mcp = FastMCP("Search server")
-exa = Exa(api_key=config.EXA_API_KEY)
+async def cached_search(query: str, **params) -> Tuple[List[dict], bool, bool]:
+    """
+    Searches Exa through the search cache.
+
+    Returns the results as dicts of title, URL and highlights, whether they were
+    cached, and whether they were shared from an identical search in flight.
+    """
+    key = search_key(query, **params)
+    if search_cache is not None:
+        cached = await search_cache.aget(key)
+        if cached is not None:
+            return json.loads(cached), True, False
+
+    async def fetch() -> str:
+        response = await exa.search_and_contents(query, **params)
+        value = json.dumps(
+            [
+                {"title": r.title, "url": r.url, "highlights": r.highlights or []}
+                for r in response.results
+            ]
+        )
+        if search_cache is not None:
+            await search_cache.aset(key, value)
+        return value
+
+    value, coalesced = await search_flight.do(key, fetch)
+    return json.loads(value), False, coalesced
+
+
+def format_results(results: List[dict]) -> str:
+    # Merged results also name the query that found them
+    return "".join(
+        [
+            (f"<Query id={idx}>{r['query']}</Query>" if "query" in r else "")
+            + f"<Title id={idx}>{r['title']}</Title>"
+            f"<URL id={idx}>{r['url']}</URL>"
+            f"<Highlight id={idx}>{''.join(r['highlights'])}</Highlight>"
+            for idx, r in enumerate(results)
+        ]
+    )
+
+
+@asynccontextmanager
+async def lifespan(server: FastMCP):
+    yield
+    await exa.client.aclose()
+    # Export the spans still pending before the process exits
+    langfuse.flush()
+
+
+mcp = FastMCP("Search server", lifespan=lifespan)
 
 
 @mcp.tool()
 @with_otel_context_from_meta
 @observe(name="trace-from-mcp-server")
-def search(query: str, _meta: dict = None) -> str:
+async def search(query: str, _meta: dict = None) -> str:
     """Search for web pages using Exa"""
 
-    response = exa.search_and_contents(
+    # Async, so the server keeps handling other tool calls during the search
+    results, cache_hit, coalesced = await cached_search(
         query, type="auto", num_results=1, highlights=True
     )
 
     langfuse.update_current_trace(
         metadata={
-            "num_results": len(response.results),
-            "results": [{"title": r.title, "url": r.url} for r in response.results],
+            "num_results": len(results),
+            "results": [{"title": r["title"], "url": r["url"]} for r in results],
+            "cache_hit": cache_hit,
+            "coalesced": coalesced,
         }
     )
 
-    result = "".join(
-        [
-            f"<Title id={idx}>{r.title}</Title>"
-            f"<URL id={idx}>{r.url}</URL>"
-            f"<Highlight id={idx}>{''.join(r.highlights)}</Highlight>"
-            for idx, r in enumerate(response.results)
-        ]
+    return format_results(results)
+
+
+@mcp.tool()
+@with_otel_context_from_meta
+@observe(name="search-many-from-mcp-server")
+async def search_many(
+    queries: List[str], num_results: Optional[int] = None, _meta: dict = None
+) -> str:
+    """
+    Search for web pages using Exa, for several queries at once.
+
+    Use this instead of several `search` calls when more than one lookup is
+    needed. Returns the results of all queries merged, each page once, with the
+    query that found it.
+    """
+    if not queries:
+        raise ValueError("queries must not be empty")
+    if len(queries) > config.SEARCH_MANY_MAX_QUERIES:
+        raise ValueError(
+            f"At most {config.SEARCH_MANY_MAX_QUERIES} queries per call, "
+            f"got {len(queries)}"
+        )
+    if num_results is None:
+        num_results = config.SEARCH_MANY_NUM_RESULTS
+    if not 1 <= num_results <= config.SEARCH_MANY_MAX_NUM_RESULTS:
+        raise ValueError(
+            f"num_results must be between 1 and {config.SEARCH_MANY_MAX_NUM_RESULTS}, "
+            f"got {num_results}"
+        )
+    semaphore = asyncio.Semaphore(config.SEARCH_MANY_CONCURRENCY)
+
+    async def one(query: str) -> Tuple[List[dict], bool, bool]:
+        async with semaphore:
+            return await cached_search(
+                query, type="auto", num_results=num_results, highlights=True
+            )
+
+    # Queries fail individually; the call only fails if all of them do
+    outcomes = await asyncio.gather(
+        *(one(query) for query in queries), return_exceptions=True
     )
 
-    langfuse.flush()
-    return result
+    merged = {}
+    failed = []
+    cache_hits = 0
+    for query, outcome in zip(queries, outcomes):
+        if isinstance(outcome, Exception):
+            failed.append({"query": query, "error": str(outcome)})
+            continue
+        results, cache_hit, _ = outcome
+        cache_hits += cache_hit
+        for r in results:
+            merged.setdefault(r["url"], {**r, "query": query})
+    if len(failed) == len(queries):
+        raise RuntimeError(f"All searches failed: {failed[0]['error']}")
+
+    langfuse.update_current_trace(
+        metadata={
+            "num_queries": len(queries),
+            "num_results": len(merged),
+            "results": [
+                {"title": r["title"], "url": r["url"]} for r in merged.values()
+            ],
+            "cache_hits": cache_hits,
+            "failed": failed,
+        }
+    )
+
+    return format_results(list(merged.values())) + "".join(
+        f"<Failed>{f['query']}</Failed>" for f in failed
+    )
 
 
 @mcp.tool()
@@ -53,9 +237,17 @@ def add(a: int, b: int, _meta: dict = None) -> int:
             "result": result,
         }
     )
-    langfuse.flush()
     return result
 
 
 if __name__ == "__main__":
-    mcp.run(transport="stdio")
+    parser = argparse.ArgumentParser(description="Exa search MCP server")
+    parser.add_argument("--transport", choices=["stdio", "http"], default="stdio")
+    parser.add_argument(
+        "--port", type=int, default=8000, help="Port of the http transport"
+    )
+    args = parser.parse_args()
+    if args.transport == "http":
+        mcp.run(transport="http", host="127.0.0.1", port=args.port, show_banner=False)
+    else:
+        mcp.run(transport="stdio")
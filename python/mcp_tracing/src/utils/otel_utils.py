@@ -7,6 +7,7 @@
 # Copied on: 2025-10-15
 # Modifications:
 # - Added `TracedMCPServer` wrapper class for transparent context propagation
+# - Cached tool and prompt listings in `TracedMCPServer`
 
 """
 OpenTelemetry context utilities for MCP _meta field propagation.
@@ -21,6 +22,7 @@ import functools
 from typing import Any, Callable, TypeVar
 
 from agents.mcp import MCPServer
+from mcp import types
 from opentelemetry import context
 from opentelemetry.context import Context
 from opentelemetry.propagate import get_global_textmap
@@ -147,15 +149,83 @@ class TracedMCPServer:
             agent = Agent(mcp_servers=[traced_server], ...)
 
     The wrapper is transparent - it delegates all methods to the underlying
-    server except for call_tool, which it wraps to inject tracing context.
+    server except for call_tool, which it wraps to inject tracing context,
+    and list_tools and list_prompts, which it caches so agent runs after the
+    first start without a round trip to the server. The caches are invalidated
+    when the server sends a `notifications/tools/list_changed` (or
+    `prompts/list_changed`) notification, which reaches the wrapper if it is
+    created before the server connects, or if the server reads its
+    `message_handler` attribute per message, like `MCPServerPool`.
 
     This wrapper works with any MCP server implementation (MCPServerStdio,
     MCPServerHTTP, or custom implementations) without requiring changes to
     the underlying server or server code.
     """
 
-    def __init__(self, server: MCPServer):
+    def __init__(self, server: MCPServer, cache_listings: bool = True):
         self._server = server
+        self.cache_listings = cache_listings
+        self._tools: list | None = None
+        self._prompts: Any = None
+        # Bumped on invalidation, so listings fetched meanwhile are not cached
+        self._generation = 0
+        self._lock = asyncio.Lock()
+
+        if hasattr(server, "message_handler"):
+            self._forward_message = server.message_handler
+            server.message_handler = self.handle_message
+        else:
+            self._forward_message = None
+
+    async def handle_message(self, message: Any) -> None:
+        """
+        MCP client session message handler, invalidating the cached listings
+        on list changed notifications, then passing messages on to the
+        server's own handler.
+        """
+        if isinstance(message, types.ServerNotification):
+            if isinstance(message.root, types.ToolListChangedNotification):
+                self.invalidate_tools_cache()
+            elif isinstance(message.root, types.PromptListChangedNotification):
+                self._generation += 1
+                self._prompts = None
+        if self._forward_message is not None:
+            await self._forward_message(message)
+
+    def invalidate_tools_cache(self) -> None:
+        self._generation += 1
+        self._tools = None
+        if hasattr(self._server, "invalidate_tools_cache"):
+            self._server.invalidate_tools_cache()
+
+    async def _cached(self, attribute: str, fetch: Callable[[], Any]) -> Any:
+        value = getattr(self, attribute)
+        if value is not None:
+            return value
+        # One fetch at a time, so concurrent first runs share it
+        async with self._lock:
+            value = getattr(self, attribute)
+            if value is None:
+                generation = self._generation
+                value = await fetch()
+                if generation == self._generation:
+                    setattr(self, attribute, value)
+            return value
+
+    async def list_tools(self, run_context: Any = None, agent: Any = None) -> list:
+        # Servers filtering tools per run or agent list them each time
+        if not self.cache_listings or callable(
+            getattr(self._server, "tool_filter", None)
+        ):
+            return await self._server.list_tools(run_context, agent)
+        return await self._cached(
+            "_tools", lambda: self._server.list_tools(run_context, agent)
+        )
+
+    async def list_prompts(self) -> Any:
+        if not self.cache_listings:
+            return await self._server.list_prompts()
+        return await self._cached("_prompts", self._server.list_prompts)
 
     async def call_tool(
         self, tool_name: str, arguments: dict[str, Any] | None = None
@@ -0,0 +1,350 @@
+"""
+A pool of warm MCP server workers behind one `MCPServer`.
+
+Starting an MCP server process pays the full import time of its dependencies,
+and one stdio pipe serializes all of its tool traffic. `MCPServerPool` keeps
+several workers connected for its whole lifetime, sends each call to the least
+busy one, and health-checks and restarts them. It is an `MCPServer` itself, so
+it can be wrapped in `TracedMCPServer` and given to an agent like any server.
+"""
+
+import asyncio
+import contextlib
+import logging
+import socket
+from typing import Any, Callable, List, Optional
+
+from agents.mcp import MCPServer, MCPServerStreamableHttp
+from mcp.client.session import MessageHandlerFnT
+from mcp.shared.exceptions import McpError
+
+logger = logging.getLogger(__name__)
+
+
+class LocalMCPServerStreamableHttp(MCPServerStreamableHttp):
+    """
+    An MCP server run as a local subprocess, reached over streamable HTTP.
+
+    The process is started on `connect` with `--transport http --port <port>`
+    appended to `command`, on a free port, and terminated on `cleanup`.
+
+    Args:
+        command: The command starting the server.
+        name: A readable name for the server.
+        startup_timeout: Seconds to wait for the server to accept connections.
+        env: Environment of the process; inherited if None.
+        **kwargs: Additional arguments for `MCPServerStreamableHttp`.
+    """
+
+    def __init__(
+        self,
+        command: List[str],
+        name: Optional[str] = None,
+        startup_timeout: float = 30.0,
+        env: Optional[dict] = None,
+        **kwargs,
+    ) -> None:
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            self.port = sock.getsockname()[1]
+        super().__init__(
+            params={"url": f"http://127.0.0.1:{self.port}/mcp"}, name=name, **kwargs
+        )
+        self.command = command
+        self.startup_timeout = startup_timeout
+        self.env = env
+        self.process: Optional[asyncio.subprocess.Process] = None
+
+    async def _wait_until_listening(self) -> None:
+        deadline = asyncio.get_running_loop().time() + self.startup_timeout
+        while True:
+            if self.process.returncode is not None:
+                raise RuntimeError(
+                    f"{self.name} exited with code {self.process.returncode}"
+                )
+            try:
+                _, writer = await asyncio.open_connection("127.0.0.1", self.port)
+            except OSError:
+                if asyncio.get_running_loop().time() > deadline:
+                    raise TimeoutError(f"{self.name} did not start listening")
+                await asyncio.sleep(0.1)
+            else:
+                writer.close()
+                return
+
+    async def connect(self) -> None:
+        self.process = await asyncio.create_subprocess_exec(
+            *self.command,
+            "--transport",
+            "http",
+            "--port",
+            str(self.port),
+            env=self.env,
+            stdout=asyncio.subprocess.DEVNULL,
+        )
+        try:
+            await self._wait_until_listening()
+            await super().connect()
+        except BaseException:
+            await self._terminate()
+            raise
+
+    async def _terminate(self) -> None:
+        if self.process is None or self.process.returncode is not None:
+            return
+        self.process.terminate()
+        try:
+            await asyncio.wait_for(self.process.wait(), 5)
+        except asyncio.TimeoutError:
+            self.process.kill()
+            await self.process.wait()
+
+    async def cleanup(self) -> None:
+        try:
+            await super().cleanup()
+        finally:
+            await self._terminate()
+
+
+class _Worker:
+    __slots__ = (
+        "index",
+        "server",
+        "in_flight",
+        "connects",
+        "restarts",
+        "failed",
+        "attempted",
+    )
+
+    def __init__(self, index: int) -> None:
+        self.index = index
+        self.server: Optional[MCPServer] = None
+        self.in_flight = 0
+        self.connects = 0
+        self.restarts = 0
+        # Set to make the supervisor drop the worker's server and start another
+        self.failed = asyncio.Event()
+        # Set once the first connection attempt finished, either way
+        self.attempted = asyncio.Event()
+
+
+class MCPServerPool(MCPServer):
+    """
+    Load-balances tool calls across `size` warm MCP server workers.
+
+    Each worker is a server from `factory`, connected and cleaned up by its own
+    supervisor task (the MCP client's cancel scopes must be exited by the task
+    that entered them). Calls go to the connected worker with the fewest calls
+    in flight. Workers are pinged every `health_check_interval` seconds, and
+    replaced when a ping or a call fails at the transport level, or when they
+    disconnect. Errors returned by tools are passed through without restarts.
+    Messages of the workers' sessions, e.g. list changed notifications, are
+    passed to `message_handler`, which can be set at any time.
+
+    Args:
+        factory: Creates the (unconnected) server of a worker, by worker index.
+        size: Number of workers.
+        name: A readable name for the pool.
+        health_check_interval: Seconds between pings of each worker.
+        health_check_timeout: Seconds a ping may take before the worker is
+            replaced.
+        restart_backoff: Seconds to wait before restarting a worker, doubled
+            after each consecutive failed start, up to a minute.
+        connect_timeout: Seconds a call waits for a connected worker when none
+            is.
+        message_handler: Handler of the messages of the workers' sessions.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[int], MCPServer],
+        size: int = 4,
+        name: str = "MCP server pool",
+        health_check_interval: float = 30.0,
+        health_check_timeout: float = 5.0,
+        restart_backoff: float = 1.0,
+        connect_timeout: float = 30.0,
+        message_handler: Optional[MessageHandlerFnT] = None,
+    ) -> None:
+        super().__init__()
+        if size < 1:
+            raise ValueError("size must be at least 1")
+        self.factory = factory
+        self.size = size
+        self._name = name
+        self.health_check_interval = health_check_interval
+        self.health_check_timeout = health_check_timeout
+        self.restart_backoff = restart_backoff
+        self.connect_timeout = connect_timeout
+        self.message_handler = message_handler
+        self.workers: List[_Worker] = []
+        self._supervisors: List[asyncio.Task] = []
+        self._closing = False
+        self._connected = asyncio.Condition()
+        self._next = 0
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    async def connect(self) -> None:
+        """Starts the workers, and waits until each first tried to connect."""
+        self._closing = False
+        self.workers = [_Worker(index) for index in range(self.size)]
+        self._supervisors = [
+            asyncio.create_task(self._supervise(worker)) for worker in self.workers
+        ]
+        await asyncio.gather(*(worker.attempted.wait() for worker in self.workers))
+        if not any(worker.server for worker in self.workers):
+            await self.cleanup()
+            raise RuntimeError(f"No worker of {self.name} could connect")
+
+    async def cleanup(self) -> None:
+        """Disconnects and stops all workers."""
+        self._closing = True
+        for worker in self.workers:
+            worker.failed.set()
+        await asyncio.gather(*self._supervisors, return_exceptions=True)
+        self._supervisors = []
+
+    async def __aenter__(self) -> "MCPServerPool":
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback) -> None:
+        await self.cleanup()
+
+    async def _supervise(self, worker: _Worker) -> None:
+        failures = 0
+        while not self._closing:
+            worker.failed.clear()
+            server = self.factory(worker.index)
+            if getattr(server, "message_handler", False) is None:
+                server.message_handler = self._handle_message
+            connects = worker.connects
+            # Each server is served by a task of its own, as the MCP client may
+            # leave a cancellation pending on the task cleaning up a broken session
+            try:
+                await asyncio.create_task(self._serve(worker, server))
+            except asyncio.CancelledError:
+                if asyncio.current_task().cancelling():
+                    raise
+            worker.attempted.set()
+            if self._closing:
+                break
+
+            failures = 1 if worker.connects > connects else failures + 1
+            worker.restarts += 1
+            delay = min(60.0, self.restart_backoff * 2 ** (failures - 1))
+            logger.warning(f"Restarting {server.name} in {delay:.1f}s")
+            with contextlib.suppress(asyncio.TimeoutError):
+                # Woken early by `cleanup`
+                await asyncio.wait_for(worker.failed.wait(), delay)
+
+    async def _serve(self, worker: _Worker, server: MCPServer) -> None:
+        """Connects `server`, and cleans it up once it failed or the pool closes."""
+        try:
+            await server.connect()
+        except Exception as e:
+            logger.error(f"{server.name} failed to connect: {e}")
+            await server.cleanup()
+            return
+        worker.connects += 1
+        worker.server = server
+        async with self._connected:
+            self._connected.notify_all()
+        worker.attempted.set()
+        try:
+            await self._health_check(worker, server)
+        finally:
+            worker.server = None
+            await server.cleanup()
+
+    async def _health_check(self, worker: _Worker, server: MCPServer) -> None:
+        """Returns once the worker failed, or the pool is closing."""
+        while not self._closing:
+            try:
+                await asyncio.wait_for(worker.failed.wait(), self.health_check_interval)
+                return
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await asyncio.wait_for(self._ping(server), self.health_check_timeout)
+            except Exception as e:
+                logger.error(f"{server.name} failed its health check: {e!r}")
+                return
+
+    async def _handle_message(self, message: Any) -> None:
+        # Looked up per message, so a handler set after connecting gets them
+        if self.message_handler is not None:
+            await self.message_handler(message)
+
+    @staticmethod
+    async def _ping(server: MCPServer) -> None:
+        session = getattr(server, "session", None)
+        if session is None:
+            await server.list_tools()
+        else:
+            await session.send_ping()
+
+    async def _acquire(self) -> _Worker:
+        """Returns the connected worker with the fewest calls in flight."""
+        async with self._connected:
+            await asyncio.wait_for(
+                self._connected.wait_for(
+                    lambda: self._closing or any(w.server for w in self.workers)
+                ),
+                self.connect_timeout,
+            )
+        if self._closing:
+            raise RuntimeError(f"{self.name} is closed")
+        # Start the scan at a rotating index, so ties are spread round-robin
+        self._next = (self._next + 1) % self.size
+        candidates = self.workers[self._next :] + self.workers[: self._next]
+        worker = min(
+            (w for w in candidates if w.server is not None),
+            key=lambda w: w.in_flight,
+        )
+        return worker
+
+    async def _run(self, operation: Callable[[MCPServer], Any]) -> Any:
+        worker = await self._acquire()
+        server = worker.server
+        worker.in_flight += 1
+        try:
+            return await operation(server)
+        except McpError:
+            # Errors of the server, e.g. unknown tools or timeouts, not of the transport
+            raise
+        except Exception:
+            if worker.server is server:
+                worker.failed.set()
+            raise
+        finally:
+            worker.in_flight -= 1
+
+    async def list_tools(self, run_context: Any = None, agent: Any = None) -> list:
+        return await self._run(lambda server: server.list_tools(run_context, agent))
+
+    async def call_tool(self, tool_name: str, arguments: Optional[dict]) -> Any:
+        return await self._run(lambda server: server.call_tool(tool_name, arguments))
+
+    async def list_prompts(self) -> Any:
+        return await self._run(lambda server: server.list_prompts())
+
+    async def get_prompt(self, name: str, arguments: Optional[dict] = None) -> Any:
+        return await self._run(lambda server: server.get_prompt(name, arguments))
+
+    @property
+    def stats(self) -> List[dict]:
+        """Connection state, calls in flight and restarts of each worker."""
+        return [
+            {
+                "worker": w.index,
+                "connected": w.server is not None,
+                "in_flight": w.in_flight,
+                "restarts": w.restarts,
+            }
+            for w in self.workers
+        ]
@@ -1,6 +1,13 @@
 # An answer evaluation is added to evaluate the quality of the answer generated by the entire RAG pipeline.
 # In this example, we evaluate the relevance and faithfulness of the answer to the question and the expected output.
-
+#
+# Dataset items are processed concurrently (up to MAX_CONCURRENCY at once), both
+# judges of an item run concurrently, and every Gemini call shares one rate limit.
+# Judgments are cached on disk, so a re-run only re-grades items whose answer,
+# documents or expected output changed.
+
+import asyncio
+import os
 from typing import Annotated, TypedDict
 
 from dotenv import load_dotenv
@@ -8,16 +15,30 @@ from langchain_google_genai import ChatGoogleGenerativeAI
 from langfuse import Evaluation, get_client
 from langfuse.experiment import ExperimentItem
 
-from python.rag.rag_bot.main import rag_bot
+from python.rag.rag_bot.experiments import (
+    MAX_CONCURRENCY,
+    ainvoke_limited,
+    concurrent_evaluators,
+)
+from python.rag.rag_bot.judge_cache import JudgeCache
+from python.rag.rag_bot.main import rag_bot, warmup
 
 load_dotenv()
+# Throttle rag_bot's own Gemini calls too, unless a rate is already configured
+os.environ.setdefault("GOOGLE_GENAI_REQUESTS_PER_SECOND", "5")
 langfuse = get_client()
 
+JUDGE_MODEL = "gemini-2.5-flash"
+JUDGE_TEMPERATURE = 0
+judge_cache = JudgeCache()
+
 
-def rag_task(*, item: ExperimentItem, **kwargs):
+async def rag_task(*, item: ExperimentItem, **kwargs):
     """Task function that runs the full RAG pipeline."""
     question = item.input["question"]  # type: ignore
-    result = rag_bot(question)
+    # rag_bot is synchronous; run it off the event loop so items run concurrently.
+    # Its query embedding and generation each take a slot of the Gemini rate limit.
+    result = await asyncio.to_thread(rag_bot, question)
 
     return {"answer": result["answer"], "documents": result["documents"]}
 
@@ -31,7 +52,7 @@ class AnswerRelevanceGrade(TypedDict):
 
 
 answer_relevance_llm = ChatGoogleGenerativeAI(
-    model="gemini-2.5-flash", temperature=0
+    model=JUDGE_MODEL, temperature=JUDGE_TEMPERATURE
 ).with_structured_output(AnswerRelevanceGrade, method="json_schema", strict=True)
 
 answer_relevance_instructions = """You are evaluating the relevance of an answer to a question.
@@ -49,16 +70,30 @@ You should return a score of 0 or 1, where:
 """
 
 
-def answer_relevance_evaluator(*, input, output, expected_output, metadata, **kwargs):
+async def answer_relevance_evaluator(
+    *, input, output, expected_output, metadata, **kwargs
+):
     """Evaluates how relevant the generated answer is to the question."""
-    result = answer_relevance_llm.invoke(
-        answer_relevance_instructions
-        + "\n\nQUESTION: "
-        + input["question"]
-        + "\n\nANSWER: "
-        + output["answer"]
-        + "\n\nEXPECTED OUTPUT: "
-        + expected_output["answer"]
+    result = await judge_cache.judge(
+        "answer_relevance",
+        answer_relevance_instructions + str(AnswerRelevanceGrade.__annotations__),
+        JUDGE_MODEL,
+        JUDGE_TEMPERATURE,
+        {
+            "question": input["question"],
+            "answer": output["answer"],
+            "expected_output": expected_output["answer"],
+        },
+        lambda: ainvoke_limited(
+            answer_relevance_llm,
+            answer_relevance_instructions
+            + "\n\nQUESTION: "
+            + input["question"]
+            + "\n\nANSWER: "
+            + output["answer"]
+            + "\n\nEXPECTED OUTPUT: "
+            + expected_output["answer"],
+        ),
     )
 
     return Evaluation(
@@ -79,7 +114,7 @@ class FaithfulnessGrade(TypedDict):
 
 
 faithfulness_llm = ChatGoogleGenerativeAI(
-    model="gemini-2.5-flash", temperature=0
+    model=JUDGE_MODEL, temperature=JUDGE_TEMPERATURE
 ).with_structured_output(FaithfulnessGrade, method="json_schema", strict=True)
 
 faithfulness_instructions = """You are evaluating the faithfulness of an answer to the source documents.
@@ -98,14 +133,22 @@ You should return a score of 0 or 1, where:
 Explain your reasoning for the score."""
 
 
-def faithfulness_evaluator(*, input, output, expected_output, metadata, **kwargs):
+async def faithfulness_evaluator(*, input, output, expected_output, metadata, **kwargs):
     """Evaluates how faithful the generated answer is to the source facts."""
-    result = faithfulness_llm.invoke(
-        faithfulness_instructions
-        + "\n\nANSWER: "
-        + output["answer"]
-        + "\n\nFACTS: "
-        + "\n\n".join(doc.page_content for doc in output["documents"])
+    result = await judge_cache.judge(
+        "faithfulness",
+        faithfulness_instructions + str(FaithfulnessGrade.__annotations__),
+        JUDGE_MODEL,
+        JUDGE_TEMPERATURE,
+        {"answer": output["answer"], "documents": output["documents"]},
+        lambda: ainvoke_limited(
+            faithfulness_llm,
+            faithfulness_instructions
+            + "\n\nANSWER: "
+            + output["answer"]
+            + "\n\nFACTS: "
+            + "\n\n".join(doc.page_content for doc in output["documents"]),
+        ),
     )
 
     return Evaluation(
@@ -119,12 +162,19 @@ if __name__ == "__main__":
     print("Fetching dataset")
     dataset = langfuse.get_dataset(name="rag_bot_evals")
 
+    # Build the retriever once up front instead of in the first concurrent items
+    warmup()
+
     print("Running answer evaluation experiment")
     dataset.run_experiment(
         name="Answer Quality: Relevance and Faithfulness",
         task=rag_task,
-        evaluators=[answer_relevance_evaluator, faithfulness_evaluator],
+        evaluators=[
+            concurrent_evaluators(answer_relevance_evaluator, faithfulness_evaluator)
+        ],
+        max_concurrency=MAX_CONCURRENCY,
     )
 
     print("Experiment run successfully")
+    print(judge_cache.summary())
     langfuse.flush()
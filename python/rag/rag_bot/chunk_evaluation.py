@@ -9,7 +9,18 @@
 # | 256        | 128          |
 # | 512        | 0            |
 # | 512        | 256          |
-
+#
+# The corpus is crawled once, and each configuration's index is built once up
+# front from that crawl; chunks whose text is shared between configurations are
+# embedded only once. Every dataset item of an experiment is then served from
+# the prebuilt index.
+#
+# The six experiments run in parallel, each processing its dataset items
+# concurrently, and every Gemini call shares one rate limit. Results are printed
+# in the order of the table above. Judgments are cached on disk, so a re-run only
+# re-grades the items whose retrieved chunks changed.
+
+import os
 from typing import Annotated, TypedDict
 
 from dotenv import load_dotenv
@@ -17,24 +28,51 @@ from langchain_google_genai import ChatGoogleGenerativeAI
 from langfuse import Evaluation, get_client
 from langfuse.experiment import ExperimentItem
 
+from python.rag.rag_bot.experiments import ainvoke_limited, run_experiments
+from python.rag.rag_bot.ingest import load_corpus
+from python.rag.rag_bot.judge_cache import JudgeCache
 from python.rag.rag_bot.main import get_retriever, urls
 
 load_dotenv()
+# Throttle rag_bot's own Gemini calls too, unless a rate is already configured
+os.environ.setdefault("GOOGLE_GENAI_REQUESTS_PER_SECOND", "5")
 langfuse = get_client()
 
+JUDGE_MODEL = "gemini-2.5-flash"
+JUDGE_TEMPERATURE = 0
+judge_cache = JudgeCache()
+
 print("Fetching dataset")
 dataset = langfuse.get_dataset(name="rag_bot_evals")
 
 
+chunk_sizes = [128, 256, 512]
+# For each chunk size: no overlap, and 50% overlap
+chunk_configs = [
+    (chunk_size, chunk_overlap)
+    for chunk_size in chunk_sizes
+    for chunk_overlap in (0, chunk_size // 2)
+]
+
+print("Loading corpus")
+corpus = load_corpus(urls)
+
+print("Building retrievers")
+retrievers = {
+    (chunk_size, chunk_overlap): get_retriever(
+        urls=urls, chunk_size=chunk_size, chunk_overlap=chunk_overlap, corpus=corpus
+    )
+    for chunk_size, chunk_overlap in chunk_configs
+}
+
+
 def create_retriever_task(chunk_size: int, chunk_overlap: int):
     """Factory function to create a retriever task with specific chunk settings."""
+    retriever = retrievers[(chunk_size, chunk_overlap)]
 
-    def retriever_task(*, item: ExperimentItem, **kwargs):
+    async def retriever_task(*, item: ExperimentItem, **kwargs):
         question = item.input["question"]
-        retriever = get_retriever(
-            urls=urls, chunk_size=chunk_size, chunk_overlap=chunk_overlap
-        )
-        docs = retriever.invoke(question)
+        docs = await retriever.ainvoke(question)
 
         return {"documents": docs}
 
@@ -51,7 +89,7 @@ class RetrieverRelevanceGrade(TypedDict):
 
 
 retrieval_relevance_llm = ChatGoogleGenerativeAI(
-    model="gemini-2.5-flash", temperature=0
+    model=JUDGE_MODEL, temperature=JUDGE_TEMPERATURE
 ).with_structured_output(RetrieverRelevanceGrade, method="json_schema", strict=True)
 
 retrieval_relevance_instructions = """You are evaluating the relevance of a set of chunks to a question. 
@@ -66,15 +104,29 @@ You should return a list of numbers, one for each chunk, indicating the relevanc
 
 
 # Define evaluation functions
-def relevant_chunks_evaluator(*, input, output, expected_output, metadata, **kwargs):
-    retrieval_relevance_result = retrieval_relevance_llm.invoke(
-        retrieval_relevance_instructions
-        + "\n\nQUESTION: "
-        + input["question"]
-        + "\n\nEXPECTED OUTPUT: "
-        + expected_output["answer"]
-        + "\n\nDOCUMENTS: "
-        + "\n\n".join(doc.page_content for doc in output["documents"])
+async def relevant_chunks_evaluator(
+    *, input, output, expected_output, metadata, **kwargs
+):
+    retrieval_relevance_result = await judge_cache.judge(
+        "retrieval_relevance",
+        retrieval_relevance_instructions + str(RetrieverRelevanceGrade.__annotations__),
+        JUDGE_MODEL,
+        JUDGE_TEMPERATURE,
+        {
+            "question": input["question"],
+            "expected_output": expected_output["answer"],
+            "documents": output["documents"],
+        },
+        lambda: ainvoke_limited(
+            retrieval_relevance_llm,
+            retrieval_relevance_instructions
+            + "\n\nQUESTION: "
+            + input["question"]
+            + "\n\nEXPECTED OUTPUT: "
+            + expected_output["answer"]
+            + "\n\nDOCUMENTS: "
+            + "\n\n".join(doc.page_content for doc in output["documents"]),
+        ),
     )
 
     # Calculate average relevance score
@@ -88,25 +140,24 @@ def relevant_chunks_evaluator(*, input, output, expected_output, metadata, **kwa
     )
 
 
-chunk_sizes = [128, 256, 512]
-for chunk_size in chunk_sizes:
-    print(f"Running experiments for chunk_size {chunk_size}")
-    # Run experiment with no overlap
-    dataset.run_experiment(
-        name=f"Chunk precision: chunk_size {chunk_size} and chunk_overlap 0",
-        task=create_retriever_task(chunk_size=chunk_size, chunk_overlap=0),
-        evaluators=[relevant_chunks_evaluator],
-        metadata={"chunk_size": chunk_size, "chunk_overlap": 0},
-    )
-
-    # Run experiment with 50% overlap
-    chunk_overlap = chunk_size // 2
-    dataset.run_experiment(
-        name=f"Chunk precision: chunk_size {chunk_size} and chunk_overlap {chunk_overlap}",
-        task=create_retriever_task(chunk_size=chunk_size, chunk_overlap=chunk_overlap),
-        evaluators=[relevant_chunks_evaluator],
-        metadata={"chunk_size": chunk_size, "chunk_overlap": chunk_overlap},
-    )
+print(f"Running {len(chunk_configs)} experiments")
+results = run_experiments(
+    dataset,
+    [
+        {
+            "name": f"Chunk precision: chunk_size {chunk_size} and chunk_overlap {chunk_overlap}",
+            "task": create_retriever_task(
+                chunk_size=chunk_size, chunk_overlap=chunk_overlap
+            ),
+            "evaluators": [relevant_chunks_evaluator],
+            "metadata": {"chunk_size": chunk_size, "chunk_overlap": chunk_overlap},
+        }
+        for chunk_size, chunk_overlap in chunk_configs
+    ],
+)
+for result in results:
+    print(result.format())
 
 print("Experiment run successfully")
+print(judge_cache.summary())
 langfuse.flush()
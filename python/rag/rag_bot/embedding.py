@@ -0,0 +1,161 @@
+# Batched, concurrent embedding of chunks.
+#
+# Chunks are embedded in batches of a tunable size with a bounded number of
+# batches in flight. A rate-limited (429) batch is retried with jittered
+# exponential backoff, and every batch waits out the backoff before starting, so
+# the whole stage slows down instead of piling more requests onto the limit.
+
+import asyncio
+import logging
+import random
+import time
+from dataclasses import dataclass
+from typing import Callable, List, Sequence
+
+from langchain_core.embeddings import Embeddings
+
+from python.rag.rag_bot.loader import run_sync
+
+logger = logging.getLogger("rag_bot.embedding")
+
+
+def approximate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token) for throughput reporting."""
+    return max(1, len(text) // 4) if text else 0
+
+
+def is_rate_limited(exc: BaseException) -> bool:
+    """
+    Whether an exception, or one it was raised from, is an HTTP 429.
+
+    Checks the status code of HTTP and Google API errors, and the
+    RESOURCE_EXHAUSTED status Google APIs report rate limiting with.
+    """
+    seen = set()
+    while exc is not None and id(exc) not in seen:
+        seen.add(id(exc))
+        for attr in ("code", "status_code"):
+            if getattr(exc, attr, None) == 429:
+                return True
+        if getattr(exc, "status", None) == "RESOURCE_EXHAUSTED":
+            return True
+        exc = exc.__cause__ or exc.__context__
+    return False
+
+
+@dataclass
+class EmbeddingStats:
+    chunks: int = 0
+    tokens: int = 0
+    batches: int = 0
+    retries: int = 0
+    seconds: float = 0.0
+
+    @property
+    def chunks_per_second(self) -> float:
+        return self.chunks / self.seconds if self.seconds else 0.0
+
+    @property
+    def tokens_per_second(self) -> float:
+        return self.tokens / self.seconds if self.seconds else 0.0
+
+
+class BatchEmbedder:
+    """
+    Embeds texts with any LangChain `Embeddings`, in concurrent batches.
+
+    Works the same with a real model or with a deterministic fake such as
+    `langchain_core.embeddings.DeterministicFakeEmbedding` for offline runs.
+
+    Args:
+        embeddings: The embedding model.
+        batch_size: Number of texts sent per request.
+        max_in_flight: Maximum number of batches being embedded at once.
+        max_retries: Retries of a rate-limited batch before giving up.
+        base_delay: Backoff before the first retry, in seconds.
+        max_delay: Upper bound of the backoff, in seconds.
+        count_tokens: Token counter used for throughput reporting.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        batch_size: int = 64,
+        max_in_flight: int = 4,
+        max_retries: int = 6,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+        count_tokens: Callable[[str], int] = approximate_tokens,
+    ) -> None:
+        if batch_size < 1 or max_in_flight < 1:
+            raise ValueError("batch_size and max_in_flight must be at least 1")
+        self.embeddings = embeddings
+        self.batch_size = batch_size
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.count_tokens = count_tokens
+        self.stats = EmbeddingStats()
+        self._resume_at = 0.0
+
+    async def _wait_for_backoff(self) -> None:
+        while (wait := self._resume_at - time.monotonic()) > 0:
+            await asyncio.sleep(wait)
+
+    async def _embed_batch(self, batch: Sequence[str]) -> List[List[float]]:
+        attempt = 0
+        while True:
+            await self._wait_for_backoff()
+            try:
+                vectors = await self.embeddings.aembed_documents(list(batch))
+            except Exception as e:
+                if attempt == self.max_retries or not is_rate_limited(e):
+                    raise
+                # Full jitter: spread retries so batches don't hit the limit together
+                delay = random.uniform(
+                    0, min(self.max_delay, self.base_delay * 2**attempt)
+                )
+                self._resume_at = max(self._resume_at, time.monotonic() + delay)
+                self.stats.retries += 1
+                attempt += 1
+                logger.warning("Embedding rate limited, retrying in %.1fs", delay)
+                continue
+            self.stats.batches += 1
+            self.stats.chunks += len(batch)
+            self.stats.tokens += sum(self.count_tokens(text) for text in batch)
+            return vectors
+
+    async def aembed(self, texts: Sequence[str]) -> List[List[float]]:
+        """Embeds texts and returns their vectors in input order."""
+        if not texts:
+            return []
+        semaphore = asyncio.Semaphore(self.max_in_flight)
+
+        async def run(batch: Sequence[str]) -> List[List[float]]:
+            async with semaphore:
+                return await self._embed_batch(batch)
+
+        start = time.perf_counter()
+        chunks, tokens = self.stats.chunks, self.stats.tokens
+        batches = await asyncio.gather(
+            *(
+                run(texts[i : i + self.batch_size])
+                for i in range(0, len(texts), self.batch_size)
+            )
+        )
+        elapsed = time.perf_counter() - start
+        self.stats.seconds += elapsed
+        logger.info(
+            "Embedded %d chunks (%d tokens) in %.2fs: %.1f chunks/s, %.1f tokens/s",
+            self.stats.chunks - chunks,
+            self.stats.tokens - tokens,
+            elapsed,
+            (self.stats.chunks - chunks) / elapsed if elapsed else 0.0,
+            (self.stats.tokens - tokens) / elapsed if elapsed else 0.0,
+        )
+        return [vector for batch in batches for vector in batch]
+
+    def embed(self, texts: Sequence[str]) -> List[List[float]]:
+        """Synchronous wrapper around `aembed`."""
+        return run_sync(self.aembed(texts))
@@ -0,0 +1,161 @@
+import asyncio
+import sys
+import time
+from typing import List
+
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding, Embeddings
+
+from python.rag.rag_bot import embedding
+from python.rag.rag_bot.embedding import BatchEmbedder, is_rate_limited
+
+
+class RateLimitError(Exception):
+    def __init__(self, message: str = "Too Many Requests") -> None:
+        super().__init__(message)
+        self.code = 429
+
+
+class FlakyEmbeddings(Embeddings):
+    """
+    A deterministic fake embedder that answers the first `failures` requests
+    with rate-limit errors, and records the size of every request.
+    """
+
+    def __init__(self, failures: int = 0, error: Exception = None) -> None:
+        self.fake = DeterministicFakeEmbedding(size=8)
+        self.failures = failures
+        self.error = error or RateLimitError()
+        self.batches: List[int] = []
+        self.starts: List[float] = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        raise NotImplementedError
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.fake.embed_query(text)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.batches.append(len(texts))
+        self.starts.append(time.monotonic())
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(0.01)
+            if self.failures:
+                self.failures -= 1
+                raise self.error
+            return self.fake.embed_documents(texts)
+        finally:
+            self.in_flight -= 1
+
+
+@pytest.fixture
+def delays(monkeypatch):
+    """Records backoff delays, drawing each one at the top of its jitter range."""
+    drawn = []
+
+    def uniform(low: float, high: float) -> float:
+        drawn.append(high)
+        return high
+
+    monkeypatch.setattr(embedding.random, "uniform", uniform)
+    return drawn
+
+
+def test_batches_concurrently_in_input_order():
+    texts = [f"chunk {i}" for i in range(10)]
+    fake = FlakyEmbeddings()
+    embedder = BatchEmbedder(fake, batch_size=3, max_in_flight=2)
+
+    vectors = embedder.embed(texts)
+
+    assert vectors == DeterministicFakeEmbedding(size=8).embed_documents(texts)
+    assert sorted(fake.batches) == [1, 3, 3, 3]
+    assert fake.max_in_flight == 2
+    assert embedder.stats.chunks == 10
+    assert embedder.stats.batches == 4
+    assert embedder.stats.tokens == sum(
+        embedding.approximate_tokens(text) for text in texts
+    )
+    assert embedder.stats.chunks_per_second > 0
+
+
+def test_retries_rate_limited_batches_with_backoff(delays):
+    texts = [f"chunk {i}" for i in range(4)]
+    fake = FlakyEmbeddings(failures=3)
+    embedder = BatchEmbedder(fake, batch_size=4, base_delay=0.02, max_delay=0.06)
+
+    start = time.monotonic()
+    vectors = embedder.embed(texts)
+    elapsed = time.monotonic() - start
+
+    assert vectors == DeterministicFakeEmbedding(size=8).embed_documents(texts)
+    assert embedder.stats.retries == 3
+    assert len(fake.batches) == 4
+    # Exponential, capped at max_delay, and waited out before the next attempt
+    assert delays == [0.02, 0.04, 0.06]
+    assert elapsed >= sum(delays)
+
+
+def test_backoff_holds_back_other_batches(delays):
+    fake = FlakyEmbeddings(failures=1)
+    embedder = BatchEmbedder(fake, batch_size=1, max_in_flight=2, base_delay=0.1)
+
+    start = time.monotonic()
+    embedder.embed(["first", "second", "third"])
+
+    # "third" only starts once "second" is done, and then waits out the backoff
+    # of the rate-limited "first" instead of adding to the load
+    assert embedder.stats.retries == 1
+    assert sorted(fake.starts)[2] - start >= 0.1
+
+
+def test_gives_up_after_max_retries(delays):
+    fake = FlakyEmbeddings(failures=10)
+    embedder = BatchEmbedder(fake, max_retries=2, base_delay=0.01)
+
+    with pytest.raises(RateLimitError):
+        embedder.embed(["chunk"])
+
+    assert len(fake.batches) == 3
+
+
+def test_does_not_retry_other_errors(delays):
+    fake = FlakyEmbeddings(failures=1, error=ValueError("429 chunks is too many"))
+    embedder = BatchEmbedder(fake)
+
+    with pytest.raises(ValueError):
+        embedder.embed(["chunk"])
+
+    assert len(fake.batches) == 1
+    assert embedder.stats.retries == 0
+
+
+def test_is_rate_limited():
+    class ResourceExhausted(Exception):
+        status = "RESOURCE_EXHAUSTED"
+
+    class HTTPError(Exception):
+        status_code = 429
+
+    try:
+        try:
+            raise RateLimitError()
+        except RateLimitError as e:
+            raise RuntimeError("Error embedding content") from e
+    except RuntimeError as e:
+        wrapped = e
+
+    assert is_rate_limited(RateLimitError())
+    assert is_rate_limited(ResourceExhausted())
+    assert is_rate_limited(HTTPError())
+    assert is_rate_limited(wrapped)
+    assert not is_rate_limited(Exception("fetched 1429 documents"))
+    assert not is_rate_limited(Exception("RESOURCE_EXHAUSTED"))
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__]))
@@ -0,0 +1,83 @@
+# Helpers to run Langfuse experiments concurrently.
+#
+# `dataset.run_experiment` already runs items concurrently when the task and
+# evaluators are async, but it runs an item's evaluators one after another. These
+# helpers run an item's LLM judges concurrently, bound the request rate per model
+# provider across all experiments of the process, and run several experiments in
+# parallel, returning everything in a deterministic order.
+
+import asyncio
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Sequence
+
+from langfuse import Evaluation
+from langfuse.experiment import ExperimentResult
+
+from python.rag.rag_bot.rate_limit import rate_limiter
+
+logger = logging.getLogger("rag_bot.experiments")
+
+# Items of one experiment being processed at once
+MAX_CONCURRENCY = int(os.environ.get("EXPERIMENT_MAX_CONCURRENCY", "8"))
+
+
+async def ainvoke_limited(llm: Any, prompt: Any, provider: str = "google_genai") -> Any:
+    """Invokes a LangChain runnable asynchronously, within the provider's rate limit."""
+    await rate_limiter(provider).acquire()
+    return await llm.ainvoke(prompt)
+
+
+def concurrent_evaluators(*evaluators: Callable) -> Callable:
+    """
+    Combines async evaluators into one that runs them concurrently per item.
+
+    The evaluations are returned in the order of `evaluators`. As with separate
+    evaluators, a failing evaluator is logged and skipped without losing the
+    others' results.
+    """
+
+    async def evaluate(**kwargs) -> List[Evaluation]:
+        results = await asyncio.gather(
+            *(evaluator(**kwargs) for evaluator in evaluators), return_exceptions=True
+        )
+        evaluations = []
+        for evaluator, result in zip(evaluators, results):
+            if isinstance(result, BaseException):
+                logger.error("Evaluator %s failed: %s", evaluator.__name__, result)
+            elif isinstance(result, list):
+                evaluations.extend(result)
+            else:
+                evaluations.append(result)
+        return evaluations
+
+    evaluate.__name__ = "+".join(evaluator.__name__ for evaluator in evaluators)
+    return evaluate
+
+
+def run_experiments(
+    dataset: Any, experiments: Sequence[Dict[str, Any]], max_parallel: int = 3
+) -> List[ExperimentResult]:
+    """
+    Runs independent experiments on a dataset in parallel.
+
+    Args:
+        dataset: The Langfuse dataset client.
+        experiments: Keyword arguments of each `dataset.run_experiment` call.
+        max_parallel: Maximum number of experiments running at once.
+
+    Returns:
+        The experiment results, in the order of `experiments`.
+    """
+    with ThreadPoolExecutor(
+        max_workers=max_parallel, thread_name_prefix="experiment"
+    ) as pool:
+        futures = [
+            pool.submit(
+                dataset.run_experiment,
+                **{"max_concurrency": MAX_CONCURRENCY, **experiment},
+            )
+            for experiment in experiments
+        ]
+        return [future.result() for future in futures]
@@ -0,0 +1,333 @@
+# Persistent, content-addressed storage for retriever indexes.
+#
+# An index is identified by the urls and content hashes of its sources together
+# with the chunking parameters and the embedding model, so identical inputs always
+# map to the same directory on disk. Each index directory holds:
+#
+#   index.json     format information
+#   vectors.npy    float32 matrix of L2-normalized rows, one per chunk
+#                  (memory-mapped on open)
+#   texts.bin      UTF-8 chunk texts, concatenated (memory-mapped on open)
+#   offsets.npy    int64 byte offsets into texts.bin, len(chunks) + 1 entries
+#   metadata.json  per-chunk document metadata
+#
+# Index directories are never written to once renamed into place. Data derived
+# from an index later, like a trained IVF clustering, goes to the sibling
+# `derived/<index key>` directory instead and is deleted with the index.
+#
+# A small per-configuration pointer file maps (urls, chunk_size, chunk_overlap,
+# embedding model) to the latest index key, so process restarts can open the
+# index without crawling the sources again. It also records each source's
+# ETag/Last-Modified/content hash, which incremental refreshes diff against.
+#
+# Vectors of every embedded chunk are also kept in an SQLite embedding cache,
+# keyed by embedding model and chunk text hash, so a chunk that was embedded for
+# any index is never sent to the embedding model again.
+
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from contextlib import closing
+from pathlib import Path
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Set
+
+import numpy as np
+from langchain_core.documents import Document
+
+DEFAULT_INDEX_DIR = os.environ.get("RAG_INDEX_DIR", ".rag_index")
+
+
+def content_hash(text: str) -> str:
+    """Returns the hex sha256 digest of a text."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """Returns a float32 copy of `vectors` with unit-length rows (zero rows stay zero)."""
+    vectors = np.array(vectors, dtype=np.float32)
+    if vectors.size == 0:
+        return vectors.reshape(0, 0)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    np.divide(vectors, norms, out=vectors, where=norms > 0)
+    return vectors
+
+
+def hash_key(payload: dict) -> str:
+    """Returns the hash of a JSON-serializable payload, independent of key order."""
+    return content_hash(json.dumps(payload, sort_keys=True))
+
+
+class StoredIndex:
+    """A read-only view over an index directory written by `IndexStore.save`."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        # Where data derived from the index is cached, outside the index itself
+        self.derived_path = path.parent.parent / "derived" / path.name
+        self.vectors = np.load(path / "vectors.npy", mmap_mode="r")
+        self._offsets = np.load(path / "offsets.npy", mmap_mode="r")
+        texts_path = path / "texts.bin"
+        # np.memmap refuses empty files, which an index of empty chunks produces
+        self._texts = (
+            np.memmap(texts_path, dtype=np.uint8, mode="r")
+            if texts_path.stat().st_size
+            else np.zeros(0, dtype=np.uint8)
+        )
+        with open(path / "metadata.json", encoding="utf-8") as f:
+            self._metadata = json.load(f)
+
+    def __len__(self) -> int:
+        return len(self._metadata)
+
+    def text(self, i: int) -> str:
+        start, end = int(self._offsets[i]), int(self._offsets[i + 1])
+        return self._texts[start:end].tobytes().decode("utf-8")
+
+    def document(self, i: int) -> Document:
+        return Document(page_content=self.text(i), metadata=dict(self._metadata[i]))
+
+    def documents(self) -> List[Document]:
+        return [self.document(i) for i in range(len(self))]
+
+    @staticmethod
+    def write(path: Path, documents: Sequence[Document], vectors: np.ndarray) -> None:
+        """Writes documents and their vectors into the (new) directory `path`."""
+        path.mkdir(parents=True)
+        encoded = [doc.page_content.encode("utf-8") for doc in documents]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+
+        with open(path / "index.json", "w", encoding="utf-8") as f:
+            json.dump({"normalized": True}, f)
+        np.save(path / "vectors.npy", normalize_rows(vectors))
+        np.save(path / "offsets.npy", offsets)
+        with open(path / "texts.bin", "wb") as f:
+            for b in encoded:
+                f.write(b)
+        with open(path / "metadata.json", "w", encoding="utf-8") as f:
+            json.dump([doc.metadata for doc in documents], f)
+
+
+class EmbeddingCache:
+    """Vectors of previously embedded chunk texts, keyed by model and text hash."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+
+    def _connect(self) -> sqlite3.Connection:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " model TEXT NOT NULL, chunk_hash TEXT NOT NULL, vector BLOB NOT NULL,"
+            " PRIMARY KEY (model, chunk_hash))"
+        )
+        return conn
+
+    def get_many(
+        self, model: str, chunk_hashes: Iterable[str]
+    ) -> Dict[str, np.ndarray]:
+        """Returns the cached vectors among `chunk_hashes`."""
+        found: Dict[str, np.ndarray] = {}
+        hashes = list(set(chunk_hashes))
+        with closing(self._connect()) as conn:
+            # Stay below SQLite's bound-parameter limit
+            for start in range(0, len(hashes), 500):
+                batch = hashes[start : start + 500]
+                rows = conn.execute(
+                    "SELECT chunk_hash, vector FROM embeddings WHERE model = ?"
+                    f" AND chunk_hash IN ({','.join('?' * len(batch))})",
+                    [model, *batch],
+                )
+                for chunk_hash, blob in rows:
+                    found[chunk_hash] = np.frombuffer(blob, dtype=np.float32)
+        return found
+
+    def put_many(self, model: str, vectors: Mapping[str, Sequence[float]]) -> None:
+        with closing(self._connect()) as conn, conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)",
+                [
+                    (model, chunk_hash, np.asarray(v, dtype=np.float32).tobytes())
+                    for chunk_hash, v in vectors.items()
+                ],
+            )
+
+    def retain(self, chunk_hashes: Set[str]) -> int:
+        """Deletes every vector whose chunk is not in `chunk_hashes`."""
+        with closing(self._connect()) as conn, conn:
+            stale = [
+                (model, chunk_hash)
+                for model, chunk_hash in conn.execute(
+                    "SELECT model, chunk_hash FROM embeddings"
+                )
+                if chunk_hash not in chunk_hashes
+            ]
+            conn.executemany(
+                "DELETE FROM embeddings WHERE model = ? AND chunk_hash = ?", stale
+            )
+        return len(stale)
+
+
+class IndexStore:
+    """
+    On-disk store of retriever indexes, keyed by content and index parameters.
+    """
+
+    def __init__(self, root: str | os.PathLike = DEFAULT_INDEX_DIR) -> None:
+        self.root = Path(root)
+        self.embedding_cache = EmbeddingCache(self.root / "embeddings.sqlite")
+
+    @staticmethod
+    def index_key(
+        source_hashes: Mapping[str, str],
+        chunk_size: int,
+        chunk_overlap: int,
+        embedding_model: str,
+    ) -> str:
+        """
+        Key of the index built from sources with the given content hashes, by url.
+
+        The urls are part of the key, since every chunk records its source url.
+        """
+        return hash_key(
+            {
+                "sources": sorted(source_hashes.items()),
+                "chunk_size": chunk_size,
+                "chunk_overlap": chunk_overlap,
+                "embedding_model": embedding_model,
+            }
+        )
+
+    @staticmethod
+    def config_key(
+        urls: Iterable[str], chunk_size: int, chunk_overlap: int, embedding_model: str
+    ) -> str:
+        """Key of a retriever configuration, independent of the sources' content."""
+        return hash_key(
+            {
+                "urls": sorted(urls),
+                "chunk_size": chunk_size,
+                "chunk_overlap": chunk_overlap,
+                "embedding_model": embedding_model,
+            }
+        )
+
+    def open(self, index_key: str) -> Optional[StoredIndex]:
+        """Opens a stored index, or returns None if it has not been built."""
+        path = self.root / "indexes" / index_key
+        if not path.is_dir():
+            return None
+        return StoredIndex(path)
+
+    def save(
+        self, index_key: str, documents: Sequence[Document], vectors: np.ndarray
+    ) -> StoredIndex:
+        """
+        Stores an index under `index_key` and returns it opened.
+
+        The index is written to a temporary directory and renamed into place, so
+        readers never observe a partially written index.
+        """
+        if len(documents) != len(vectors):
+            raise ValueError(
+                f"Got {len(documents)} documents but {len(vectors)} vectors"
+            )
+        indexes = self.root / "indexes"
+        indexes.mkdir(parents=True, exist_ok=True)
+        final = indexes / index_key
+        tmp = Path(tempfile.mkdtemp(dir=indexes, prefix=".tmp-"))
+        try:
+            StoredIndex.write(tmp / "index", documents, vectors)
+            os.replace(tmp / "index", final)
+        except OSError:
+            # Another process stored the same content-addressed index first.
+            if not final.is_dir():
+                raise
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+        return StoredIndex(final)
+
+    def _read_config(self, config_key: str) -> dict:
+        try:
+            with open(
+                self.root / "configs" / f"{config_key}.json", encoding="utf-8"
+            ) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def lookup(self, config_key: str) -> Optional[str]:
+        """Returns the latest index key recorded for a configuration."""
+        return self._read_config(config_key).get("index_key")
+
+    def sources(self, config_key: str) -> Dict[str, dict]:
+        """Returns the per-source state recorded with a configuration's index."""
+        return self._read_config(config_key).get("sources", {})
+
+    def source_hashes(self) -> Set[str]:
+        """Returns the content hashes of the sources recorded by any configuration."""
+        return {
+            state["content_hash"]
+            for path in (self.root / "configs").glob("*.json")
+            for state in self.sources(path.stem).values()
+            if state.get("content_hash")
+        }
+
+    def record(
+        self,
+        config_key: str,
+        index_key: str,
+        sources: Optional[Dict[str, dict]] = None,
+    ) -> None:
+        """Points a configuration at the given index key."""
+        path = self.root / "configs" / f"{config_key}.json"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"index_key": index_key, "sources": sources or {}}, f)
+        os.replace(tmp, path)
+
+    def prune(self, grace_period: float = 600.0) -> List[str]:
+        """
+        Deletes indexes no configuration points to and returns their keys.
+
+        Indexes saved less than `grace_period` seconds ago are kept, since
+        another process may not have recorded its configuration yet. Data
+        derived from the deleted indexes, and cached vectors of chunks that no
+        remaining index contains, are dropped too.
+        Processes that still have a pruned index memory-mapped keep reading it;
+        the data is released once they drop it.
+        """
+        live = {
+            self.lookup(path.stem) for path in (self.root / "configs").glob("*.json")
+        }
+        pruned = []
+        for path in (self.root / "indexes").glob("*"):
+            if path.name.startswith(".") or path.name in live:
+                continue
+            try:
+                age = time.time() - path.stat().st_mtime
+            except OSError:
+                continue
+            if age < grace_period:
+                live.add(path.name)
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+            pruned.append(path.name)
+        for path in (self.root / "derived").glob("*"):
+            if path.name not in live:
+                shutil.rmtree(path, ignore_errors=True)
+
+        live_chunks = set()
+        for index_key in live:
+            if index_key and (index := self.open(index_key)):
+                live_chunks.update(
+                    content_hash(index.text(i)) for i in range(len(index))
+                )
+        self.embedding_cache.retain(live_chunks)
+        return pruned
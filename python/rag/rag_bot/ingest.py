@@ -0,0 +1,251 @@
+# Incremental ingestion of the RAG corpus into an `IndexStore`.
+#
+# Each refresh diffs the sources against the state recorded with the previous
+# index: sources answering 304 Not Modified, or whose text hashes to the same
+# value as before, keep their chunks and vectors as they are. Changed sources are
+# re-split, from token counts stored the first time their text was seen (see
+# `tokenized.py`), and only chunks whose text is not in the store's embedding
+# cache are sent to the embedding model. Chunks of removed sources, or chunks that
+# disappeared from a changed source, are dropped from the new index and, once no
+# index contains them, from the embedding cache.
+
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from python.rag.rag_bot.embedding import BatchEmbedder
+from python.rag.rag_bot.index_store import IndexStore, StoredIndex, content_hash
+from python.rag.rag_bot.loader import AsyncSourceLoader, FetchResult, run_sync
+from python.rag.rag_bot.tokenized import TokenizedCorpus
+
+logger = logging.getLogger("rag_bot.ingest")
+
+
+@dataclass
+class IngestStats:
+    """What a refresh had to do, per source and per chunk."""
+
+    sources_unchanged: int = 0
+    sources_changed: int = 0
+    sources_removed: int = 0
+    chunks_reused: int = 0
+    chunks_embedded: int = 0
+    chunks_removed: int = 0
+
+
+def make_tokenized_corpus(store: IndexStore) -> TokenizedCorpus:
+    """Token counts of the store's sources, for tiktoken-sized chunks."""
+    return TokenizedCorpus(store.root / "tokens")
+
+
+def _rows_by_source(previous: Optional[StoredIndex]) -> Dict[str, List[int]]:
+    """Maps each source to its rows in the previous index."""
+    rows: Dict[str, List[int]] = {}
+    if previous is not None:
+        for i in range(len(previous)):
+            source = previous.document(i).metadata.get("source", "")
+            rows.setdefault(source, []).append(i)
+    return rows
+
+
+def refresh_index(
+    store: IndexStore,
+    urls: List[str],
+    chunk_size: int,
+    chunk_overlap: int,
+    embeddings: Embeddings,
+    embedding_model: str,
+    loader: Optional[AsyncSourceLoader] = None,
+    embedder: Optional[BatchEmbedder] = None,
+    corpus: Optional[Sequence[FetchResult]] = None,
+) -> Tuple[StoredIndex, IngestStats]:
+    """Synchronous wrapper around `arefresh_index`."""
+    return run_sync(
+        arefresh_index(
+            store,
+            urls,
+            chunk_size,
+            chunk_overlap,
+            embeddings,
+            embedding_model,
+            loader=loader,
+            embedder=embedder,
+            corpus=corpus,
+        )
+    )
+
+
+async def aload_corpus(
+    urls: List[str], loader: Optional[AsyncSourceLoader] = None
+) -> List[FetchResult]:
+    """Fetches every source once, in url order."""
+    loader = loader or AsyncSourceLoader()
+    fetched = {f.url: f async for f in loader.stream((url, None) for url in urls)}
+    return [fetched[url] for url in urls]
+
+
+def load_corpus(
+    urls: List[str], loader: Optional[AsyncSourceLoader] = None
+) -> List[FetchResult]:
+    """
+    Fetches every source once, so several chunk configurations can be built
+    from one crawl by passing the result as `corpus` to `refresh_index`.
+    """
+    return run_sync(aload_corpus(urls, loader))
+
+
+async def arefresh_index(
+    store: IndexStore,
+    urls: List[str],
+    chunk_size: int,
+    chunk_overlap: int,
+    embeddings: Embeddings,
+    embedding_model: str,
+    loader: Optional[AsyncSourceLoader] = None,
+    embedder: Optional[BatchEmbedder] = None,
+    corpus: Optional[Sequence[FetchResult]] = None,
+) -> Tuple[StoredIndex, IngestStats]:
+    """
+    Brings the configuration's index up to date with its sources.
+
+    Sources are fetched concurrently, unless an already fetched `corpus` (see
+    `load_corpus`) is given, and each one is split as soon as it arrives. Only
+    new or changed chunks are embedded, in concurrent batches by `embedder` (a
+    default `BatchEmbedder` over `embeddings` if not given); everything else is
+    carried over from the previously recorded index for the same configuration.
+
+    Returns:
+        The up-to-date index and what it took to build it.
+    """
+    config_key = IndexStore.config_key(urls, chunk_size, chunk_overlap, embedding_model)
+    previous_key = store.lookup(config_key)
+    previous = store.open(previous_key) if previous_key else None
+    previous_state = store.sources(config_key) if previous else {}
+    rows_by_source = _rows_by_source(previous)
+
+    if corpus is not None:
+        missing = set(urls) - {fetched.url for fetched in corpus}
+        if missing:
+            raise ValueError(f"The corpus has no fetch result for {sorted(missing)}")
+
+    loader = loader or AsyncSourceLoader()
+    tokenized = make_tokenized_corpus(store)
+    stats = IngestStats()
+    state: Dict[str, dict] = {}
+    chunks_by_source: Dict[str, List[Document]] = {}
+
+    # Only send validators for sources the previous index still has chunks of,
+    # so a 304 always has something to carry over
+    sources = [
+        (url, previous_state.get(url) if url in rows_by_source else None)
+        for url in urls
+    ]
+
+    async def fetch_all() -> AsyncIterator[FetchResult]:
+        if corpus is not None:
+            for fetched in corpus:
+                yield fetched
+        else:
+            async for fetched in loader.stream(sources):
+                yield fetched
+
+    async for fetched in fetch_all():
+        url = fetched.url
+        prior = previous_state.get(url, {})
+        if url in rows_by_source and (
+            fetched.not_modified
+            or content_hash(fetched.document.page_content) == prior.get("content_hash")
+        ):
+            stats.sources_unchanged += 1
+            state[url] = dict(prior)
+            if not fetched.not_modified:
+                state[url].update(
+                    etag=fetched.etag, last_modified=fetched.last_modified
+                )
+            continue
+
+        stats.sources_changed += 1
+        state[url] = {
+            "etag": fetched.etag,
+            "last_modified": fetched.last_modified,
+            "content_hash": content_hash(fetched.document.page_content),
+        }
+        chunks_by_source[url] = await asyncio.to_thread(
+            tokenized.split_documents, [fetched.document], chunk_size, chunk_overlap
+        )
+
+    # Assemble in url order, so the index does not depend on arrival order.
+    # Each chunk's vector is either a row of the previous index or, for chunks
+    # of changed sources, looked up by text hash.
+    documents: List[Document] = []
+    vector_rows: List[Optional[int]] = []
+    chunk_hashes: List[Optional[str]] = []
+    for url in urls:
+        if url in chunks_by_source:
+            for chunk in chunks_by_source[url]:
+                documents.append(chunk)
+                vector_rows.append(None)
+                chunk_hashes.append(content_hash(chunk.page_content))
+        else:
+            for row in rows_by_source[url]:
+                documents.append(previous.document(row))
+                vector_rows.append(row)
+                chunk_hashes.append(None)
+
+    stats.sources_removed = len(set(previous_state) - set(urls))
+
+    index_key = IndexStore.index_key(
+        {url: s["content_hash"] for url, s in state.items()},
+        chunk_size,
+        chunk_overlap,
+        embedding_model,
+    )
+    index = store.open(index_key)
+    if index is None:
+        needed = {h for h in chunk_hashes if h is not None}
+        cached = store.embedding_cache.get_many(embedding_model, needed)
+        to_embed = {
+            h: doc.page_content
+            for h, doc in zip(chunk_hashes, documents)
+            if h is not None and h not in cached
+        }
+        if to_embed:
+            embedder = embedder or BatchEmbedder(embeddings)
+            embedded = dict(
+                zip(to_embed, await embedder.aembed(list(to_embed.values())))
+            )
+            store.embedding_cache.put_many(embedding_model, embedded)
+            cached.update(embedded)
+
+        stats.chunks_embedded = len(to_embed)
+        carried = {row for row in vector_rows if row is not None}
+        stats.chunks_reused = len(carried)
+        new_chunks = {h for h in chunk_hashes if h is not None}
+        stats.chunks_removed = sum(
+            1
+            for i in range(len(previous) if previous is not None else 0)
+            if i not in carried and content_hash(previous.text(i)) not in new_chunks
+        )
+        vectors = np.asarray(
+            [
+                previous.vectors[row] if row is not None else cached[chunk_hash]
+                for row, chunk_hash in zip(vector_rows, chunk_hashes)
+            ],
+            dtype=np.float32,
+        )
+        index = store.save(index_key, documents, vectors)
+    else:
+        stats.chunks_reused = len(index)
+
+    store.record(config_key, index_key, state)
+    if previous_key and previous_key != index_key:
+        store.prune()
+        tokenized.retain(store.source_hashes())
+
+    logger.info("Refreshed index %s: %s", index_key[:12], stats)
+    return index, stats
@@ -0,0 +1,142 @@
+# Persistent cache of LLM judge results.
+#
+# A judgment is keyed by the evaluator name, the hash of its prompt template (and
+# output schema), the judge model and temperature, and the normalized inputs the
+# prompt is built from. Re-running an experiment after changing one stage of the
+# pipeline therefore only re-grades the items whose judged inputs changed.
+
+import json
+import sqlite3
+import threading
+import unicodedata
+from contextlib import closing
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Mapping, Optional
+
+from langchain_core.documents import Document
+
+from python.rag.rag_bot.index_store import DEFAULT_INDEX_DIR, content_hash, hash_key
+
+
+def normalize_inputs(value: Any) -> Any:
+    """
+    Normalizes judge inputs so equivalent values map to the same key.
+
+    Texts are NFC-normalized with Unix line endings and surrounding whitespace
+    stripped, and documents are reduced to their text.
+    """
+    if isinstance(value, str):
+        return unicodedata.normalize("NFC", value.replace("\r\n", "\n")).strip()
+    if isinstance(value, Document):
+        return normalize_inputs(value.page_content)
+    if isinstance(value, Mapping):
+        return {str(k): normalize_inputs(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [normalize_inputs(v) for v in value]
+    return value
+
+
+@dataclass
+class JudgeCacheStats:
+    hits: int = 0
+    misses: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class JudgeCache:
+    """
+    Judge results stored in SQLite, shared across runs and processes.
+
+    Args:
+        path: The SQLite database; defaults to `judgments.sqlite` in the index
+            directory.
+    """
+
+    def __init__(self, path: Optional[Path] = None) -> None:
+        self.path = Path(path or Path(DEFAULT_INDEX_DIR) / "judgments.sqlite")
+        self.stats = JudgeCacheStats()
+        self._stats_lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS judgments ("
+            " key TEXT PRIMARY KEY, evaluator TEXT NOT NULL, result TEXT NOT NULL)"
+        )
+        return conn
+
+    @staticmethod
+    def key(
+        evaluator: str,
+        template: str,
+        model: str,
+        temperature: float,
+        inputs: Mapping[str, Any],
+    ) -> str:
+        return hash_key(
+            {
+                "evaluator": evaluator,
+                "template": content_hash(template),
+                "model": model,
+                "temperature": temperature,
+                "inputs": normalize_inputs(inputs),
+            }
+        )
+
+    def get(self, key: str) -> Optional[dict]:
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT result FROM judgments WHERE key = ?", (key,)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, key: str, evaluator: str, result: Mapping[str, Any]) -> None:
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO judgments VALUES (?, ?, ?)",
+                (key, evaluator, json.dumps(result)),
+            )
+
+    async def judge(
+        self,
+        evaluator: str,
+        template: str,
+        model: str,
+        temperature: float,
+        inputs: Mapping[str, Any],
+        grade: Callable[[], Awaitable[Mapping[str, Any]]],
+    ) -> dict:
+        """
+        Returns the cached judgment of `inputs`, or grades them and caches it.
+
+        Args:
+            evaluator: Name of the evaluator.
+            template: The prompt template, including anything else that shapes
+                the judgment, such as the output schema.
+            model: The judge model.
+            temperature: The judge temperature.
+            inputs: Every value the prompt is built from.
+            grade: Asks the judge; called on a cache miss.
+        """
+        key = self.key(evaluator, template, model, temperature, inputs)
+        if (result := self.get(key)) is not None:
+            with self._stats_lock:
+                self.stats.hits += 1
+            return result
+        with self._stats_lock:
+            self.stats.misses += 1
+        result = dict(await grade())
+        self.put(key, evaluator, result)
+        return result
+
+    def summary(self) -> str:
+        return (
+            f"Judge cache: {self.stats.hits} hits, {self.stats.misses} misses"
+            f" ({100 * self.stats.hit_rate:.0f}% hit rate)"
+        )
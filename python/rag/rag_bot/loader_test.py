@@ -0,0 +1,205 @@
+import asyncio
+import sys
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from python.rag.rag_bot import ingest
+from python.rag.rag_bot.index_store import IndexStore
+from python.rag.rag_bot.loader import AsyncSourceLoader, FetchResult
+
+
+def page(title: str, body: str) -> str:
+    return (
+        f"<html lang='en'><head><title>{title}</title></head><body>{body}</body></html>"
+    )
+
+
+class StandIn:
+    """
+    A local HTTP stand-in serving fixture pages, recording its traffic.
+
+    Pages answer with their ETag, and with 304 to a matching If-None-Match.
+    """
+
+    def __init__(self, pages: Dict[str, str], latency: float = 0.05) -> None:
+        self.pages = pages
+        self.latency = latency
+        self.etags: Dict[str, str] = {}
+        self.in_flight: Counter = Counter()
+        self.max_in_flight: Counter = Counter()
+        self.starts: List[Tuple[str, float]] = []
+        self.responses: List[Tuple[str, int]] = []
+
+    async def handler(self, request: httpx.Request) -> httpx.Response:
+        url, host = str(request.url), request.url.host
+        self.starts.append((host, time.monotonic()))
+        self.in_flight[host] += 1
+        self.in_flight["*"] += 1
+        self.max_in_flight[host] = max(self.max_in_flight[host], self.in_flight[host])
+        self.max_in_flight["*"] = max(self.max_in_flight["*"], self.in_flight["*"])
+        try:
+            await asyncio.sleep(self.latency)
+        finally:
+            self.in_flight[host] -= 1
+            self.in_flight["*"] -= 1
+        if url not in self.pages:
+            response = httpx.Response(404, text="Not Found")
+        elif (
+            url in self.etags
+            and request.headers.get("If-None-Match") == self.etags[url]
+        ):
+            response = httpx.Response(304)
+        else:
+            headers = {"ETag": self.etags[url]} if url in self.etags else {}
+            response = httpx.Response(200, text=self.pages[url], headers=headers)
+        self.responses.append((url, response.status_code))
+        return response
+
+    def loader(self, **kwargs) -> AsyncSourceLoader:
+        client = httpx.AsyncClient(transport=httpx.MockTransport(self.handler))
+        return AsyncSourceLoader(client=client, **kwargs)
+
+
+async def collect(
+    loader: AsyncSourceLoader, urls: List[str], previous: Optional[dict] = None
+) -> List[FetchResult]:
+    return [r async for r in loader.stream((url, previous) for url in urls)]
+
+
+def test_fetches_concurrently_and_parses_pages():
+    urls = [f"http://host{i}.test/page" for i in range(8)]
+    server = StandIn({url: page(url, f"Body of {url}") for url in urls}, latency=0.2)
+
+    start = time.monotonic()
+    results = asyncio.run(collect(server.loader(max_concurrency=8), urls))
+    elapsed = time.monotonic() - start
+
+    assert elapsed < 0.2 * 4
+    assert server.max_in_flight["*"] == 8
+    assert sorted(r.url for r in results) == sorted(urls)
+    for result in results:
+        assert not result.not_modified
+        assert result.document.page_content == f"{result.url}Body of {result.url}"
+        assert result.document.metadata == {
+            "source": result.url,
+            "title": result.url,
+            "language": "en",
+        }
+
+
+def test_bounds_requests_in_flight_overall():
+    urls = [f"http://host{i}.test/page" for i in range(8)]
+    server = StandIn({url: page("t", "b") for url in urls})
+
+    asyncio.run(collect(server.loader(max_concurrency=3), urls))
+
+    assert server.max_in_flight["*"] == 3
+
+
+def test_per_host_gate_limits_and_spaces_out_requests():
+    busy = [f"http://busy.test/{i}" for i in range(6)]
+    other = [f"http://other.test/{i}" for i in range(2)]
+    server = StandIn({url: page("t", "b") for url in busy + other})
+
+    loader = server.loader(max_concurrency=16, per_host_limit=2, host_delay=0.03)
+    asyncio.run(collect(loader, busy + other))
+
+    assert server.max_in_flight["busy.test"] == 2
+    busy_starts = [t for host, t in server.starts if host == "busy.test"]
+    gaps = [b - a for a, b in zip(busy_starts, busy_starts[1:])]
+    assert min(gaps) >= 0.03 * 0.9
+    # Other hosts are not held up by the busy one
+    other_start = min(t for host, t in server.starts if host == "other.test")
+    assert other_start - server.starts[0][1] < 0.03
+
+
+def test_sends_validators_and_reports_not_modified():
+    url = "http://host.test/page"
+    server = StandIn({url: page("t", "b")})
+    server.etags[url] = '"v1"'
+
+    (fresh,) = asyncio.run(collect(server.loader(), [url]))
+    (cached,) = asyncio.run(collect(server.loader(), [url], {"etag": fresh.etag}))
+
+    assert fresh.etag == '"v1"' and not fresh.not_modified
+    assert cached.not_modified and cached.document is None
+
+
+def test_error_status_fails_the_whole_stream():
+    # A refresh must not record an index that silently lost one of its sources
+    urls = ["http://host.test/ok", "http://host.test/missing"]
+    server = StandIn({urls[0]: page("t", "b")})
+
+    with pytest.raises(httpx.HTTPStatusError) as error:
+        asyncio.run(collect(server.loader(), urls))
+
+    assert error.value.response.status_code == 404
+    assert str(error.value.request.url) == urls[1]
+
+
+class CharacterSplitter:
+    """Stands in for the tiktoken-based `TokenizedCorpus`, which needs encodings."""
+
+    def split_documents(self, documents, chunk_size, chunk_overlap):
+        splitter = RecursiveCharacterTextSplitter(
+            chunk_size=chunk_size, chunk_overlap=chunk_overlap
+        )
+        return splitter.split_documents(documents)
+
+    def retain(self, source_hashes):
+        pass
+
+
+def test_refresh_skips_unmodified_and_unchanged_sources(tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        ingest, "make_tokenized_corpus", lambda store: CharacterSplitter()
+    )
+    urls = ["http://a.test/page", "http://b.test/page", "http://c.test/page"]
+    server = StandIn(
+        {
+            url: page(url, " ".join(f"{url} word {i}." for i in range(40)))
+            for url in urls
+        }
+    )
+    # a.test answers 304 to its validator; b.test and c.test have none
+    server.etags[urls[0]] = '"a1"'
+    store = IndexStore(tmp_path)
+    embeddings = DeterministicFakeEmbedding(size=8)
+
+    def refresh():
+        server.responses.clear()
+        return ingest.refresh_index(
+            store, urls, 100, 0, embeddings, "fake", loader=server.loader()
+        )
+
+    first, stats = refresh()
+    assert stats.sources_changed == 3
+    assert stats.chunks_embedded == len(first)
+    assert stats.chunks_reused == 0
+
+    # Unmodified (304) and unchanged (same content hash) sources are carried over
+    second, stats = refresh()
+    assert dict(server.responses) == {urls[0]: 304, urls[1]: 200, urls[2]: 200}
+    assert stats.sources_unchanged == 3
+    assert stats.chunks_embedded == 0
+    assert second.path == first.path
+
+    # Only the changed source is split and embedded again
+    server.pages[urls[2]] = page(urls[2], "Completely new text.")
+    third, stats = refresh()
+    assert stats.sources_unchanged == 2
+    assert stats.sources_changed == 1
+    assert stats.chunks_embedded == 1
+    assert [d.page_content for d in third.documents()][-1] == urls[
+        2
+    ] + "Completely new text."
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__]))
@@ -1,14 +1,18 @@
-from typing import List
+from typing import List, Optional
 
 from dotenv import load_dotenv
-from langchain_community.document_loaders import WebBaseLoader
 from langchain_core.retrievers import BaseRetriever
-from langchain_core.vectorstores import InMemoryVectorStore
 from langchain_google_genai import ChatGoogleGenerativeAI, GoogleGenerativeAIEmbeddings
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langfuse import get_client, observe
 from langfuse.langchain import CallbackHandler
 
+from python.rag.rag_bot.index_store import DEFAULT_INDEX_DIR, IndexStore
+from python.rag.rag_bot.ingest import refresh_index
+from python.rag.rag_bot.loader import FetchResult
+from python.rag.rag_bot.rate_limit import ChatRateLimiter, RateLimitedEmbeddings
+from python.rag.rag_bot.registry import RetrieverRegistry
+from python.rag.rag_bot.vector_index import VectorIndexRetriever
+
 load_dotenv()
 
 urls = [
@@ -20,13 +24,24 @@ urls = [
 langfuse = get_client()
 langfuse_handler = CallbackHandler()
 
-bot = ChatGoogleGenerativeAI(model="gemini-2.5-flash")
+# Unthrottled unless GOOGLE_GENAI_REQUESTS_PER_SECOND is set; then each Gemini
+# request, generation or embedding, takes a slot of the shared limit
+bot = ChatGoogleGenerativeAI(
+    model="gemini-2.5-flash", rate_limiter=ChatRateLimiter("google_genai")
+)
+
+EMBEDDING_MODEL = "text-embedding-004"
+CHUNK_SIZE = 256
+CHUNK_OVERLAP = 0
+K = 3
 
 
 # Add decorator so this function is traced in Lngfuse
 @observe()
 def rag_bot(question: str):
-    retriever = get_retriever(urls, chunk_size=256, chunk_overlap=0)
+    retriever = retrievers.get(
+        urls, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP, k=K
+    )
     # Trace the document retrieval, and add the documents to the span
     with langfuse.start_as_current_observation(
         name="retrieve_documents", input=question, as_type="retriever"
@@ -57,22 +72,70 @@ def rag_bot(question: str):
 
 
 def get_retriever(
-    urls: List[str], chunk_size: int = 250, chunk_overlap: int = 0, k: int = 3
+    urls: List[str],
+    chunk_size: int = 250,
+    chunk_overlap: int = 0,
+    k: int = 3,
+    refresh: bool = False,
+    index_dir: str = DEFAULT_INDEX_DIR,
+    approximate: bool = False,
+    corpus: Optional[List[FetchResult]] = None,
 ) -> BaseRetriever:
-    docs = [WebBaseLoader(url).load() for url in urls]
-    docs_list = [item for sublist in docs for item in sublist]
-
-    text_splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
-        chunk_size=chunk_size, chunk_overlap=chunk_overlap
+    """
+    Returns a retriever over the given urls, backed by a persistent index.
+
+    The index for a (urls, chunk_size, chunk_overlap, embedding model)
+    configuration is built once and memory-mapped on later calls, including
+    after a restart. Pass `refresh=True` to re-crawl the sources; only chunks
+    that are new or changed since the last build are embedded. Pass
+    `approximate=True` to search an IVF index, for very large corpora.
+
+    To build several configurations from one crawl, pass the sources fetched
+    once by `load_corpus(urls)` as `corpus`; the configuration's index is then
+    brought up to date with it instead of with a new crawl.
+    """
+    store = IndexStore(index_dir)
+    embeddings = RateLimitedEmbeddings(
+        GoogleGenerativeAIEmbeddings(model=EMBEDDING_MODEL), "google_genai"
     )
-    doc_splits = text_splitter.split_documents(docs_list)
-
-    vectorstore = InMemoryVectorStore.from_documents(
-        documents=doc_splits,
-        embedding=GoogleGenerativeAIEmbeddings(model="text-embedding-004"),
+    config_key = IndexStore.config_key(urls, chunk_size, chunk_overlap, EMBEDDING_MODEL)
+
+    index = None
+    if not refresh and corpus is None and (index_key := store.lookup(config_key)):
+        index = store.open(index_key)
+    if index is None:
+        index, _ = refresh_index(
+            store,
+            urls,
+            chunk_size,
+            chunk_overlap,
+            embeddings,
+            EMBEDDING_MODEL,
+            corpus=corpus,
+        )
+
+    return VectorIndexRetriever(
+        index=index, embeddings=embeddings, k=k, approximate=approximate
     )
 
-    return vectorstore.as_retriever(k=k)
+
+# Shared by every rag_bot() call in the process, so the index is built once
+retrievers = RetrieverRegistry(get_retriever)
+
+
+def warmup(wait: bool = True):
+    """Builds rag_bot's retriever before the first question arrives."""
+    return retrievers.warmup([(urls, CHUNK_SIZE, CHUNK_OVERLAP, K)], wait=wait)
+
+
+def refresh() -> BaseRetriever:
+    """
+    Re-crawls rag_bot's sources and swaps the rebuilt retriever in; questions
+    asked meanwhile are answered from the current one.
+    """
+    return retrievers.refresh(
+        urls, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP, k=K
+    )
 
 
 if __name__ == "__main__":
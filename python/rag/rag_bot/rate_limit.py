@@ -0,0 +1,139 @@
+# Request rate limits per model provider.
+#
+# One limiter per provider is shared by everything in the process, across
+# threads and event loops. Evaluations always use it (see `experiments.py`); the
+# bot's own models only do when the provider's rate is configured.
+
+import asyncio
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+from langchain_core.embeddings import Embeddings
+from langchain_core.rate_limiters import BaseRateLimiter
+
+
+class RateLimiter:
+    """
+    Spaces out requests to `rate` per second, allowing bursts of `burst`.
+
+    Thread-safe and not tied to an event loop, so one limiter can be shared by
+    experiments running on different threads (each with its own loop).
+    """
+
+    def __init__(self, rate: float, burst: int = 1) -> None:
+        self._interval = 1.0 / rate
+        self._tolerance = self._interval * (burst - 1)
+        self._lock = threading.Lock()
+        self._next_free = 0.0
+
+    def _reserve(self) -> float:
+        """Reserves the next slot and returns how long to wait for it."""
+        with self._lock:
+            now = time.monotonic()
+            start = max(self._next_free, now)
+            self._next_free = start + self._interval
+            return start - self._tolerance - now
+
+    async def acquire(self) -> None:
+        wait = self._reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def acquire_sync(self) -> None:
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+
+_rate_limiters: Dict[str, RateLimiter] = {}
+_rate_limiters_lock = threading.Lock()
+
+
+def rate_limiter(provider: str) -> RateLimiter:
+    """
+    Returns the process-wide limiter of a model provider.
+
+    The rate is read from `<PROVIDER>_REQUESTS_PER_SECOND` (default 5) and the
+    burst from `<PROVIDER>_BURST` (default 5), e.g. GOOGLE_GENAI_REQUESTS_PER_SECOND.
+    """
+    with _rate_limiters_lock:
+        if provider not in _rate_limiters:
+            prefix = provider.upper()
+            _rate_limiters[provider] = RateLimiter(
+                rate=float(os.environ.get(f"{prefix}_REQUESTS_PER_SECOND", "5")),
+                burst=int(os.environ.get(f"{prefix}_BURST", "5")),
+            )
+        return _rate_limiters[provider]
+
+
+def configured_rate_limiter(provider: str) -> Optional[RateLimiter]:
+    """
+    Returns the provider's limiter if `<PROVIDER>_REQUESTS_PER_SECOND` is set,
+    and None otherwise, so callers go unthrottled unless configured.
+    """
+    if f"{provider.upper()}_REQUESTS_PER_SECOND" not in os.environ:
+        return None
+    return rate_limiter(provider)
+
+
+def _acquire_sync(provider: str) -> None:
+    limiter = configured_rate_limiter(provider)
+    if limiter is not None:
+        limiter.acquire_sync()
+
+
+async def _acquire(provider: str) -> None:
+    limiter = configured_rate_limiter(provider)
+    if limiter is not None:
+        await limiter.acquire()
+
+
+class ChatRateLimiter(BaseRateLimiter):
+    """
+    Makes a LangChain chat model take a slot of a provider's limiter per request.
+
+    Pass it as the model's `rate_limiter`, e.g.
+    `ChatGoogleGenerativeAI(..., rate_limiter=ChatRateLimiter("google_genai"))`.
+    Requests are only held back if the provider's rate is configured (see
+    `configured_rate_limiter`).
+    """
+
+    def __init__(self, provider: str) -> None:
+        self.provider = provider
+
+    def acquire(self, *, blocking: bool = True) -> bool:
+        _acquire_sync(self.provider)
+        return True
+
+    async def aacquire(self, *, blocking: bool = True) -> bool:
+        await _acquire(self.provider)
+        return True
+
+
+class RateLimitedEmbeddings(Embeddings):
+    """
+    Wraps an embedding model so each request takes a slot of a provider's
+    limiter, if its rate is configured (see `configured_rate_limiter`).
+    """
+
+    def __init__(self, embeddings: Embeddings, provider: str = "google_genai") -> None:
+        self.embeddings = embeddings
+        self.provider = provider
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        _acquire_sync(self.provider)
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        _acquire_sync(self.provider)
+        return self.embeddings.embed_query(text)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        await _acquire(self.provider)
+        return await self.embeddings.aembed_documents(texts)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        await _acquire(self.provider)
+        return await self.embeddings.aembed_query(text)
@@ -0,0 +1,123 @@
+# Process-wide registry of retrievers.
+#
+# Each (urls, chunk_size, chunk_overlap, k) configuration is built once per
+# process. Concurrent callers asking for a configuration that is being built
+# wait on that single build instead of starting their own, and a refresh builds
+# the new retriever on the side and swaps it in atomically, so callers never see
+# a half-built index or block on a refresh. Builds are numbered as they start,
+# and one only swaps in its retriever if no later build got there first, so a
+# slow first build never replaces a refreshed index.
+
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from langchain_core.retrievers import BaseRetriever
+
+logger = logging.getLogger("rag_bot.registry")
+
+RetrieverKey = Tuple[Tuple[str, ...], int, int, int]
+
+
+class RetrieverRegistry:
+    """
+    Builds each retriever configuration once and shares it across callers.
+
+    Args:
+        build: Builds a retriever from (urls, chunk_size, chunk_overlap, k,
+            refresh), e.g. `get_retriever`.
+    """
+
+    def __init__(self, build: Callable[..., BaseRetriever]) -> None:
+        self._build = build
+        self._lock = threading.Lock()
+        self._retrievers: Dict[RetrieverKey, BaseRetriever] = {}
+        self._in_flight: Dict[Tuple[RetrieverKey, bool], Future] = {}
+        # Number of the latest build started, and of the build in use, per key
+        self._started: Dict[RetrieverKey, int] = {}
+        self._installed: Dict[RetrieverKey, int] = {}
+
+    @staticmethod
+    def key(
+        urls: Iterable[str], chunk_size: int, chunk_overlap: int, k: int
+    ) -> RetrieverKey:
+        return (tuple(urls), chunk_size, chunk_overlap, k)
+
+    def _single_flight(self, key: RetrieverKey, refresh: bool) -> BaseRetriever:
+        with self._lock:
+            if not refresh and key in self._retrievers:
+                return self._retrievers[key]
+            future = self._in_flight.get((key, refresh))
+            owner = future is None
+            if owner:
+                future = self._in_flight[(key, refresh)] = Future()
+                generation = self._started[key] = self._started.get(key, 0) + 1
+
+        if not owner:
+            return future.result()
+
+        try:
+            urls, chunk_size, chunk_overlap, k = key
+            retriever = self._build(
+                list(urls),
+                chunk_size=chunk_size,
+                chunk_overlap=chunk_overlap,
+                k=k,
+                refresh=refresh,
+            )
+        except BaseException as e:
+            with self._lock:
+                del self._in_flight[(key, refresh)]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            # Swap in the new retriever, unless a build started later already
+            # swapped in its own; callers holding the old one keep using it
+            # until they ask again
+            if generation > self._installed.get(key, 0):
+                self._retrievers[key] = retriever
+                self._installed[key] = generation
+            elif not refresh:
+                retriever = self._retrievers[key]
+            del self._in_flight[(key, refresh)]
+        future.set_result(retriever)
+        return retriever
+
+    def get(
+        self, urls: List[str], chunk_size: int, chunk_overlap: int, k: int = 3
+    ) -> BaseRetriever:
+        """Returns the retriever for a configuration, building it on first use."""
+        return self._single_flight(self.key(urls, chunk_size, chunk_overlap, k), False)
+
+    def refresh(
+        self, urls: List[str], chunk_size: int, chunk_overlap: int, k: int = 3
+    ) -> BaseRetriever:
+        """Rebuilds a configuration from fresh sources and swaps it in."""
+        return self._single_flight(self.key(urls, chunk_size, chunk_overlap, k), True)
+
+    def warmup(
+        self, configs: Iterable[RetrieverKey], wait: bool = True
+    ) -> Optional[Future]:
+        """
+        Builds the given configurations ahead of the first request.
+
+        Args:
+            configs: (urls, chunk_size, chunk_overlap, k) configurations.
+            wait: Block until all are built; otherwise build them on a
+                background thread and return a future of that work.
+        """
+        configs = [self.key(*config) for config in configs]
+
+        def build_all() -> None:
+            for config in configs:
+                self._single_flight(config, False)
+            logger.info("Warmed up %d retriever configurations", len(configs))
+
+        if wait:
+            build_all()
+            return None
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="warmup")
+        future = executor.submit(build_all)
+        executor.shutdown(wait=False)
+        return future
@@ -0,0 +1,232 @@
+# Pre-tokenized corpus for token-based chunking.
+#
+# `RecursiveCharacterTextSplitter.from_tiktoken_encoder` splits a document on
+# "\n\n", then "\n", " " and finally characters, and only ever measures those
+# pieces: a piece is split further when it has at least `chunk_size` tokens, and
+# chunks are merged from the token counts of their pieces. The pieces depend on
+# the text alone, not on the chunking parameters, so each document is walked
+# once and the (start, end, token count) of every piece down to
+# `min_chunk_size` tokens is stored in compact arrays. Splitting with any
+# (chunk_size, chunk_overlap) then runs the same splitter over those counts
+# instead of re-encoding the corpus, and yields exactly the same chunks.
+
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import tiktoken
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from python.rag.rag_bot.index_store import content_hash
+
+# Separators of `RecursiveCharacterTextSplitter`, in the order it tries them
+SEPARATORS = ["\n\n", "\n", " ", ""]
+
+
+def _pieces(
+    text: str, start: int, end: int, separators: Sequence[str]
+) -> Tuple[List[Tuple[int, int]], Sequence[str]]:
+    """
+    Splits text[start:end] the way the splitter does at one level.
+
+    Returns the (start, end) of each piece, with the separator kept at the start
+    of the piece that follows it, and the separators to split the pieces with.
+    """
+    segment = text[start:end]
+    for i, separator in enumerate(separators):
+        if not separator:
+            return [(start + j, start + j + 1) for j in range(len(segment))], []
+        if separator in segment:
+            bounds = [0]
+            bounds += [m.start() for m in re.finditer(re.escape(separator), segment)]
+            bounds.append(len(segment))
+            pieces = [
+                (start + a, start + b) for a, b in zip(bounds, bounds[1:]) if b > a
+            ]
+            return pieces, separators[i + 1 :]
+    # Like the splitter, fall back to the last separator
+    return [(start, end)] if end > start else [], []
+
+
+class TokenCounts:
+    """
+    Token counts of the pieces of one document, as offset arrays.
+
+    Args:
+        starts: Character offset where each piece starts.
+        ends: Character offset where each piece ends.
+        counts: Number of tokens in each piece.
+        min_chunk_size: Pieces with at least this many tokens were broken down
+            further, so splits with a `chunk_size` of at least this need no
+            encoding.
+    """
+
+    def __init__(
+        self,
+        starts: np.ndarray,
+        ends: np.ndarray,
+        counts: np.ndarray,
+        min_chunk_size: int,
+    ) -> None:
+        self.starts = starts
+        self.ends = ends
+        self.counts = counts
+        self.min_chunk_size = min_chunk_size
+
+    @classmethod
+    def build(
+        cls, text: str, encoding: tiktoken.Encoding, min_chunk_size: int
+    ) -> "TokenCounts":
+        """Walks the pieces of `text` level by level, encoding each piece once."""
+        # Raises on special tokens like the splitter does; pieces of text without
+        # any can then be encoded without looking for them
+        if any(token in text for token in encoding.special_tokens_set):
+            encoding.encode(text, allowed_special=set(), disallowed_special="all")
+        starts: List[int] = []
+        ends: List[int] = []
+        counts: List[int] = []
+        level = [(0, len(text), SEPARATORS)]
+        while level:
+            pieces: List[Tuple[int, int]] = []
+            remaining: List[Sequence[str]] = []
+            for start, end, separators in level:
+                level_pieces, rest = _pieces(text, start, end, separators)
+                pieces += level_pieces
+                remaining += [rest] * len(level_pieces)
+            lengths = [len(encoding.encode_ordinary(text[a:b])) for a, b in pieces]
+            level = []
+            for (a, b), rest, length in zip(pieces, remaining, lengths):
+                starts.append(a)
+                ends.append(b)
+                counts.append(length)
+                if rest and length >= min_chunk_size:
+                    level.append((a, b, rest))
+        return cls(
+            np.asarray(starts, dtype=np.int64),
+            np.asarray(ends, dtype=np.int64),
+            np.asarray(counts, dtype=np.int32),
+            min_chunk_size,
+        )
+
+    def lengths(self, text: str) -> Dict[str, int]:
+        """Maps the text of each piece of `text` to its token count."""
+        lengths = {"": 0}
+        for start, end, count in zip(
+            self.starts.tolist(), self.ends.tolist(), self.counts.tolist()
+        ):
+            lengths[text[start:end]] = count
+        return lengths
+
+    def save(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp.npz"
+        np.savez(
+            tmp,
+            starts=self.starts,
+            ends=self.ends,
+            counts=self.counts,
+            min_chunk_size=self.min_chunk_size,
+        )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: Path) -> "TokenCounts":
+        data = np.load(path)
+        return cls(
+            data["starts"], data["ends"], data["counts"], int(data["min_chunk_size"])
+        )
+
+
+class TokenizedCorpus:
+    """
+    Splits documents into token-sized chunks from stored token counts.
+
+    Produces the same chunks as
+    `RecursiveCharacterTextSplitter.from_tiktoken_encoder(chunk_size=...,
+    chunk_overlap=...)`, but each document is only tokenized the first time it
+    is seen, whatever the chunking parameters.
+
+    Args:
+        root: Directory where token counts are stored, keyed by document content
+            hash; kept in memory only if not given.
+        encoding_name: The tiktoken encoding to count tokens with.
+        min_chunk_size: Smallest chunk size that needs no encoding at all;
+            smaller chunk sizes still split correctly, encoding the extra pieces.
+    """
+
+    def __init__(
+        self,
+        root: Optional[Path] = None,
+        encoding_name: str = "gpt2",
+        min_chunk_size: int = 64,
+    ) -> None:
+        self.root = Path(root) / encoding_name if root is not None else None
+        self.encoding_name = encoding_name
+        self.min_chunk_size = min_chunk_size
+        self._counts: Dict[str, TokenCounts] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def encoding(self) -> tiktoken.Encoding:
+        return tiktoken.get_encoding(self.encoding_name)
+
+    def _count(self, text: str) -> int:
+        return len(
+            self.encoding.encode(text, allowed_special=set(), disallowed_special="all")
+        )
+
+    def counts(self, text: str) -> TokenCounts:
+        """Returns the token counts of a document's pieces, tokenizing it if needed."""
+        key = content_hash(text)
+        with self._lock:
+            if key in self._counts:
+                return self._counts[key]
+        path = self.root / f"{key}.npz" if self.root is not None else None
+        counts = None
+        if path is not None and path.exists():
+            counts = TokenCounts.load(path)
+        if counts is None or counts.min_chunk_size > self.min_chunk_size:
+            counts = TokenCounts.build(text, self.encoding, self.min_chunk_size)
+            if path is not None:
+                counts.save(path)
+        with self._lock:
+            self._counts[key] = counts
+        return counts
+
+    def split_documents(
+        self, documents: Sequence[Document], chunk_size: int, chunk_overlap: int
+    ) -> List[Document]:
+        chunks: List[Document] = []
+        for document in documents:
+            lengths = self.counts(document.page_content).lengths(document.page_content)
+
+            def length(piece: str) -> int:
+                # Pieces below `min_chunk_size` are only measured when splitting
+                # with a smaller chunk size
+                if piece not in lengths:
+                    lengths[piece] = self._count(piece)
+                return lengths[piece]
+
+            splitter = RecursiveCharacterTextSplitter(
+                chunk_size=chunk_size,
+                chunk_overlap=chunk_overlap,
+                length_function=length,
+            )
+            chunks.extend(splitter.split_documents([document]))
+        return chunks
+
+    def retain(self, content_hashes: Sequence[str]) -> int:
+        """Deletes stored token counts of every document not in `content_hashes`."""
+        if self.root is None or not self.root.is_dir():
+            return 0
+        keep = set(content_hashes)
+        removed = 0
+        for path in self.root.glob("*.npz"):
+            if ".tmp" not in path.name and path.stem not in keep:
+                path.unlink(missing_ok=True)
+                removed += 1
+        return removed
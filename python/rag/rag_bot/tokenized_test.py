@@ -0,0 +1,125 @@
+"""
+Checks that `TokenizedCorpus.split_documents` yields exactly the chunks of
+`RecursiveCharacterTextSplitter.from_tiktoken_encoder`, on the texts in
+testdata/splitter.
+
+The texts cover paragraph, line and word breaks, words and paragraphs longer
+than a chunk, text without any separator, and non-ASCII text; the
+(chunk_size, chunk_overlap) pairs include chunk sizes below `min_chunk_size`.
+Every split is compared with a small byte-level BPE encoding trained on the
+texts, which needs no download, and with the real tiktoken encodings when they
+can be loaded.
+"""
+
+import collections
+import sys
+from pathlib import Path
+from typing import Dict, List
+
+import pytest
+import regex
+import tiktoken
+import tiktoken.registry
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from python.rag.rag_bot.tokenized import TokenizedCorpus
+
+TESTDATA = Path(__file__).parent / "testdata" / "splitter"
+MIN_CHUNK_SIZE = 64
+SPLITS = [
+    (8, 0),
+    (16, 4),
+    (32, 8),
+    (63, 10),
+    (64, 0),
+    (100, 20),
+    (256, 50),
+    (1000, 200),
+]
+# The pre-tokenization pattern of gpt2
+PAT_STR = r"""'(?:[sdmt]|ll|ve|re)| ?\p{L}+| ?\p{N}+| ?[^\s\p{L}\p{N}]+|\s+(?!\S)|\s+"""
+
+
+def golden_texts() -> Dict[str, str]:
+    return {
+        path.stem: path.read_text(encoding="utf-8")
+        for path in sorted(TESTDATA.glob("*.txt"))
+    }
+
+
+def train_bpe(texts: List[str], merges: int) -> Dict[bytes, int]:
+    """Learns the ranks of a byte-level BPE with `merges` merges."""
+    ranks = {bytes([i]): i for i in range(256)}
+    words = collections.Counter(
+        tuple(bytes([b]) for b in word.encode("utf-8"))
+        for text in texts
+        for word in regex.findall(PAT_STR, text)
+    )
+    for _ in range(merges):
+        pairs = collections.Counter()
+        for word, count in words.items():
+            for pair in zip(word, word[1:]):
+                pairs[pair] += count
+        if not pairs:
+            break
+        (a, b), _ = pairs.most_common(1)[0]
+        ranks[a + b] = len(ranks)
+        merged = collections.Counter()
+        for word, count in words.items():
+            out, i = [], 0
+            while i < len(word):
+                if i + 1 < len(word) and (word[i], word[i + 1]) == (a, b):
+                    out.append(a + b)
+                    i += 2
+                else:
+                    out.append(word[i])
+                    i += 1
+            merged[tuple(out)] += count
+        words = merged
+    return ranks
+
+
+@pytest.fixture(scope="module", params=["test_bpe", "gpt2", "cl100k_base"])
+def encoding_name(request):
+    name = request.param
+    if name == "test_bpe":
+        ranks = train_bpe(list(golden_texts().values()), merges=300)
+        tiktoken.list_encoding_names()  # Loads the registry
+        tiktoken.registry.ENCODING_CONSTRUCTORS[name] = lambda: {
+            "name": name,
+            "pat_str": PAT_STR,
+            "mergeable_ranks": ranks,
+            "special_tokens": {"<|endoftext|>": len(ranks)},
+        }
+    else:
+        try:
+            tiktoken.get_encoding(name)
+        except Exception as e:
+            pytest.skip(f"Cannot load the {name} encoding: {e}")
+    return name
+
+
+@pytest.mark.parametrize("chunk_size,chunk_overlap", SPLITS)
+def test_matches_the_text_splitter(encoding_name, chunk_size, chunk_overlap, tmp_path):
+    corpus = TokenizedCorpus(
+        root=tmp_path, encoding_name=encoding_name, min_chunk_size=MIN_CHUNK_SIZE
+    )
+    expected = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
+        encoding_name=encoding_name,
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+    )
+    texts = golden_texts()
+    assert texts, f"No texts in {TESTDATA}"
+    for name, text in texts.items():
+        document = Document(page_content=text, metadata={"source": name})
+        want = expected.split_documents([document])
+        got = corpus.split_documents([document], chunk_size, chunk_overlap)
+        assert [(d.page_content, d.metadata) for d in got] == [
+            (d.page_content, d.metadata) for d in want
+        ], name
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__]))
@@ -0,0 +1,209 @@
+# Vectorized top-k search over a stored index's embedding matrix.
+#
+# Rows are stored L2-normalized, so cosine similarity is a single matrix-vector
+# product. Exact search selects the top k with `argpartition` (linear time)
+# and only sorts those k. For corpora of hundreds of thousands of chunks, an
+# inverted-file (IVF) index clusters the rows with spherical k-means and only
+# scores the rows of the `n_probe` clusters closest to the query.
+
+import math
+import os
+import threading
+from typing import List, Optional, Tuple
+
+import numpy as np
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForRetrieverRun,
+    CallbackManagerForRetrieverRun,
+)
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+from pydantic import ConfigDict, PrivateAttr
+
+from python.rag.rag_bot.index_store import StoredIndex, normalize_rows
+
+# Rows scored per block when assigning rows to clusters, to bound memory use
+_BLOCK_ROWS = 65536
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Positions of the `k` highest scores, best first."""
+    if k >= len(scores):
+        return np.argsort(-scores, kind="stable")
+    candidates = np.argpartition(-scores, k - 1)[:k]
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
+class ExactSearch:
+    """Brute-force search over all rows."""
+
+    def __init__(self, vectors: np.ndarray) -> None:
+        self.vectors = vectors
+
+    def search(self, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        scores = self.vectors @ query
+        ids = top_k(scores, k)
+        return ids, scores[ids]
+
+
+class IVFSearch:
+    """
+    Approximate search that only scores rows in the clusters nearest the query.
+
+    Args:
+        vectors: L2-normalized rows to search.
+        n_lists: Number of clusters; defaults to about 4 * sqrt(len(vectors)).
+        n_probe: Number of clusters scored per query. Higher is more accurate
+            and slower; `n_probe == n_lists` is an exact search.
+        train_size: Number of rows sampled to train the clusters.
+        iterations: k-means iterations.
+        seed: Seed of the training sample and initial centroids.
+    """
+
+    def __init__(
+        self,
+        vectors: np.ndarray,
+        n_lists: Optional[int] = None,
+        n_probe: int = 8,
+        train_size: int = 50_000,
+        iterations: int = 10,
+        seed: int = 0,
+    ) -> None:
+        self.vectors = vectors
+        self.n_probe = n_probe
+        rng = np.random.default_rng(seed)
+        sample_ids = rng.choice(
+            len(vectors), min(train_size, len(vectors)), replace=False
+        )
+        sample = np.asarray(vectors[np.sort(sample_ids)])
+        self.n_lists = max(
+            1, min(len(sample), n_lists or int(4 * math.sqrt(len(vectors))))
+        )
+        self.centroids = self._train(sample, rng, iterations)
+        assignments = self._assign(vectors)
+        # Rows grouped by cluster (CSR layout): rows of cluster c are
+        # order[offsets[c]:offsets[c + 1]]
+        self.order = np.argsort(assignments, kind="stable")
+        self.offsets = np.zeros(self.n_lists + 1, dtype=np.int64)
+        np.cumsum(
+            np.bincount(assignments, minlength=self.n_lists), out=self.offsets[1:]
+        )
+
+    def _train(
+        self, sample: np.ndarray, rng: np.random.Generator, iterations: int
+    ) -> np.ndarray:
+        centroids = sample[rng.choice(len(sample), self.n_lists, replace=False)].copy()
+        for _ in range(iterations):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            empty = ~sums.any(axis=1)
+            # Re-seed clusters that lost all their rows
+            sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+            centroids = normalize_rows(sums)
+        return centroids
+
+    def _assign(self, vectors: np.ndarray) -> np.ndarray:
+        labels = np.empty(len(vectors), dtype=np.int64)
+        for start in range(0, len(vectors), _BLOCK_ROWS):
+            block = np.asarray(vectors[start : start + _BLOCK_ROWS])
+            labels[start : start + len(block)] = np.argmax(
+                block @ self.centroids.T, axis=1
+            )
+        return labels
+
+    def search(self, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        probes = top_k(self.centroids @ query, self.n_probe)
+        # Sorted, so rows are read from the (memory-mapped) matrix in order
+        candidates = np.sort(
+            np.concatenate(
+                [self.order[self.offsets[c] : self.offsets[c + 1]] for c in probes]
+            )
+        )
+        scores = self.vectors[candidates] @ query
+        best = top_k(scores, k)
+        return candidates[best], scores[best]
+
+    def save(self, path: str | os.PathLike) -> None:
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp.npz"
+        np.savez(tmp, centroids=self.centroids, order=self.order, offsets=self.offsets)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(
+        cls, path: str | os.PathLike, vectors: np.ndarray, n_probe: int = 8
+    ) -> "IVFSearch":
+        data = np.load(path)
+        search = cls.__new__(cls)
+        search.vectors = vectors
+        search.n_probe = n_probe
+        search.centroids = data["centroids"]
+        search.order = data["order"]
+        search.offsets = data["offsets"]
+        search.n_lists = len(search.centroids)
+        return search
+
+
+def ivf_for(
+    index: StoredIndex, n_lists: Optional[int] = None, n_probe: int = 8
+) -> IVFSearch:
+    """
+    Returns an IVF search over a stored index, training it on first use.
+
+    The clustering is saved with the index's derived data (written to a
+    temporary file and renamed into place), so other processes and later runs
+    load it instead of training again.
+    """
+    path = index.derived_path / f"ivf-{n_lists or 'auto'}.npz"
+    if path.exists():
+        return IVFSearch.load(path, index.vectors, n_probe=n_probe)
+    search = IVFSearch(index.vectors, n_lists=n_lists, n_probe=n_probe)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    search.save(path)
+    return search
+
+
+class VectorIndexRetriever(BaseRetriever):
+    """
+    Returns the `k` chunks of a `StoredIndex` most similar to the query.
+
+    A drop-in replacement for `InMemoryVectorStore.as_retriever(k=k)`. Set
+    `approximate=True` to search an IVF index instead of every row.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    index: StoredIndex
+    embeddings: Embeddings
+    k: int = 3
+    approximate: bool = False
+    n_lists: Optional[int] = None
+    n_probe: int = 8
+
+    _search: Optional[ExactSearch | IVFSearch] = PrivateAttr(default=None)
+
+    def _searcher(self) -> ExactSearch | IVFSearch:
+        if self._search is None:
+            if self.approximate:
+                self._search = ivf_for(self.index, self.n_lists, self.n_probe)
+            else:
+                self._search = ExactSearch(self.index.vectors)
+        return self._search
+
+    def _documents(self, query_vector: List[float]) -> List[Document]:
+        if len(self.index) == 0:
+            return []
+        query = normalize_rows([query_vector])[0]
+        ids, _ = self._searcher().search(query, self.k)
+        return [self.index.document(int(i)) for i in ids]
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        return self._documents(self.embeddings.embed_query(query))
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        return self._documents(await self.embeddings.aembed_query(query))